@@ -0,0 +1,131 @@
+import time
+import random
+import argparse
+from typing import Callable, List
+
+from chunker import TokenCounter, chunk_markdown
+
+def legacy_chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
+    """The original character-based chunk_text from crawl_pydantic_ai_docs.py, kept for comparison."""
+    chunks = []
+    start = 0
+    text_length = len(text)
+
+    while start < text_length:
+        end = start + chunk_size
+
+        if end >= text_length:
+            chunks.append(text[start:].strip())
+            break
+
+        chunk = text[start:end]
+        code_block = chunk.rfind('```')
+        if code_block != -1 and code_block > chunk_size * 0.3:
+            end = start + code_block
+        elif '\n\n' in chunk:
+            last_break = chunk.rfind('\n\n')
+            if last_break > chunk_size * 0.3:
+                end = start + last_break
+        elif '. ' in chunk:
+            last_period = chunk.rfind('. ')
+            if last_period > chunk_size * 0.3:
+                end = start + last_period + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = max(start + 1, end)
+
+    return chunks
+
+def make_docs_markdown(sections: int, seed: int = 0) -> str:
+    """Generate documentation-like markdown: headings, prose, lists and code blocks."""
+    rng = random.Random(seed)
+    words = "agent model tool result context dependency retry stream message schema validation prompt".split()
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Section {i}\n")
+        for _ in range(rng.randint(1, 4)):
+            sentence_count = rng.randint(3, 12)
+            parts.append(" ".join(
+                " ".join(rng.choice(words) for _ in range(rng.randint(5, 20))).capitalize() + "."
+                for _ in range(sentence_count)
+            ) + "\n")
+        if rng.random() < 0.5:
+            parts.append("```python\n" + "".join(
+                f"result_{j} = agent.run_sync('{rng.choice(words)}')\n" for j in range(rng.randint(3, 60))
+            ) + "```\n")
+        if rng.random() < 0.3:
+            parts.append("".join(f"- {rng.choice(words)} {rng.choice(words)}\n" for _ in range(rng.randint(2, 8))))
+    return "\n".join(parts)
+
+def make_pathological_markdown(size: int) -> str:
+    """A single long line with no paragraph, sentence or code block breaks."""
+    return ("pydantic_ai" * (size // 11 + 1))[:size]
+
+def make_code_fence_markdown(size: int) -> str:
+    """Many short fenced blocks so every window contains a late ``` marker."""
+    block = "```\nx = 1\n```\n"
+    return (block * (size // len(block) + 1))[:size]
+
+def make_fence_at_30_markdown(size: int, window: int = 5000) -> str:
+    """
+    Break-free prose with a fenced code block opening just past 30% of every
+    legacy window and closing past its end. The legacy chunker cuts at the
+    last ``` it sees, so it separates every block from its closing fence.
+    """
+    prose = ("pydantic_ai " * (window // 12 + 1))[:int(window * 0.3) + 10]
+    code = "```python\n" + "".join(f"result_{j} = agent.run_sync(prompt_{j})\n" for j in range(95)) + "```\n"
+    block = prose + "\n" + code
+    return (block * (size // len(block) + 1))[:size]
+
+def chunk_stats(chunks: List[str]) -> tuple:
+    """Largest chunk in tokens, and how many chunks cut through a code block (odd number of fences)."""
+    max_tokens = max((TokenCounter(chunk).count(0, len(chunk)) for chunk in chunks), default=0)
+    split_fences = sum(chunk.count("```") % 2 for chunk in chunks)
+    return max_tokens, split_fences
+
+def time_it(fn: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the token-aware chunker against the legacy chunk_text.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000], help="Input sizes in characters")
+    parser.add_argument("--max-tokens", type=int, default=1200)
+    parser.add_argument("--overlap-tokens", type=int, default=0, help="Overlap of the new chunker's chunks")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'input':<14}{'chars':>12}{'legacy s':>10}{'chunks':>8}{'max tok':>9}{'split':>7}"
+        f"{'new s':>10}{'chunks':>8}{'max tok':>9}{'split':>7}"
+    )
+    for size in args.sizes:
+        inputs = {
+            "docs": make_docs_markdown(size // 400)[:size],
+            "no-breaks": make_pathological_markdown(size),
+            "many-fences": make_code_fence_markdown(size),
+            "fence-at-30%": make_fence_at_30_markdown(size),
+        }
+        for name, text in inputs.items():
+            chunk = lambda: chunk_markdown(text, max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+            legacy_chunks = legacy_chunk_text(text)
+            new_chunks = [c.text(text) for c in chunk()]
+            legacy_time = time_it(lambda: legacy_chunk_text(text), args.repeat)
+            new_time = time_it(chunk, args.repeat)
+            legacy_max, legacy_split = chunk_stats(legacy_chunks)
+            new_max, new_split = chunk_stats(new_chunks)
+            print(
+                f"{name:<14}{len(text):>12,}{legacy_time:>10.4f}{len(legacy_chunks):>8}{legacy_max:>9}{legacy_split:>7}"
+                f"{new_time:>10.4f}{len(new_chunks):>8}{new_max:>9}{new_split:>7}"
+            )
+    print("max tok: largest chunk in tokens; split: chunks that cut through a code block")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import time
+import shutil
+import tempfile
+import argparse
+from typing import List
+
+import numpy as np
+
+from vector_index import LocalVectorIndex
+
+def synthetic_snapshot(path: str, rows: int, dimensions: int, seed: int) -> LocalVectorIndex:
+    """Build a snapshot of clustered random embeddings, for when no real snapshot is at hand."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(rows // 500, 10), dimensions))
+    embeddings = centers[rng.integers(0, len(centers), rows)] + rng.normal(scale=0.8, size=(rows, dimensions))
+    index = LocalVectorIndex(path)
+    index.replace(
+        [{"id": i, "title": "", "content": "", "metadata": {}} for i in range(rows)],
+        embeddings.astype(np.float32)
+    )
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the recall loss, memory and latency of compressed local vector indexes.")
+    parser.add_argument("--index", default=None, help="Path of a vector_index.py snapshot (without extension); default is a synthetic corpus")
+    parser.add_argument("--rows", type=int, default=20_000, help="Rows in the synthetic corpus")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Dimensions of the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "index")
+        if args.index:
+            # Work on a copy so the compressed files don't end up next to the real snapshot
+            for extension in (".npy", ".json"):
+                shutil.copy(args.index + extension, path + extension)
+            exact = LocalVectorIndex(path)
+        else:
+            exact = synthetic_snapshot(path, args.rows, args.dimensions, args.seed)
+
+        # Queries are perturbed copies of stored rows, like questions close to a chunk
+        rng = np.random.default_rng(args.seed + 1)
+        picks = rng.integers(0, len(exact), args.queries)
+        noise = rng.normal(scale=0.02, size=(args.queries, exact.matrix.shape[1]))
+        queries = np.asarray(exact.matrix[picks]) + noise.astype(np.float32)
+        truth: List[set] = [{row["id"] for row in exact.search(query, args.k)} for query in queries]
+
+        rows, dimensions = exact.matrix.shape
+        print(f"{rows:,} rows x {dimensions} dimensions, {args.queries} queries, recall@{args.k} against float32 exact search")
+        print(f"{'precision':<11}{'rerank':>8}{'bytes/row':>11}{'memory MB':>11}{f'recall@{args.k}':>11}{'p50 ms':>9}{'p95 ms':>9}")
+        for precision in ("float32", "float16", "int8"):
+            for rerank_factor in (args.rerank_factors if precision != "float32" else [0]):
+                index = LocalVectorIndex(path, precision=precision, rerank_factor=rerank_factor)
+                recalls, latencies = [], []
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    found = {row["id"] for row in index.search(query, args.k)}
+                    latencies.append(time.perf_counter() - start)
+                    recalls.append(len(found & expected) / len(expected))
+                print(
+                    f"{precision:<11}{rerank_factor or '-':>8}{index.bytes_per_row:>11,}"
+                    f"{index.bytes_per_row * rows / 1e6:>11.1f}{np.mean(recalls):>11.3f}"
+                    f"{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from types import SimpleNamespace
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# The agent module builds its OpenAI model at import; no request is ever sent here
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import pydantic_ai_agent as agent
+from pydantic_ai_agent import PydanticAIDeps, retrieve_relevant_documentation
+from chunker import chunk_markdown
+from context_budget import ContextBudget
+from query_cache import QueryEmbeddingCache
+from vector_index import LocalVectorIndex
+from evaluate_retrieval import FIXTURES_PATH, hashing_embedding
+
+# Metrics where a lower value in the new run is a regression
+QUALITY_METRICS = ("recall@1", "recall@3", "recall@5", "mrr")
+
+class HashingEmbeddings:
+    """Deterministic stand-in for the OpenAI embeddings endpoint, see hashing_embedding()."""
+
+    async def create(self, model: str, input):
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[SimpleNamespace(embedding=hashing_embedding(text)) for text in texts])
+
+class RecordingIndex(LocalVectorIndex):
+    """Local index that remembers the ranked rows of its last search, for recall and MRR."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_matches: List[Dict[str, Any]] = []
+
+    def search(self, *args, **kwargs):
+        self.last_matches = super().search(*args, **kwargs)
+        return self.last_matches
+
+    def hybrid_search(self, *args, **kwargs):
+        self.last_matches = super().hybrid_search(*args, **kwargs)
+        return self.last_matches
+
+@dataclass
+class BenchmarkContext:
+    """The part of RunContext the RAG tool uses."""
+    deps: PydanticAIDeps
+
+def rechunk(corpus: List[Dict[str, Any]], max_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    """Join the fixture chunks back into pages and split them again with the crawler's chunker."""
+    pages: Dict[str, List[Dict[str, Any]]] = {}
+    for row in corpus:
+        pages.setdefault(row["url"], []).append(row)
+    rows = []
+    for url, chunks in pages.items():
+        chunks.sort(key=lambda row: row["chunk_number"])
+        markdown = "\n\n".join(f"## {row['title']}\n\n{row['content']}" for row in chunks)
+        for number, chunk in enumerate(chunk_markdown(markdown, max_tokens=max_tokens, overlap_tokens=overlap_tokens)):
+            rows.append({
+                "id": len(rows) + 1,
+                "url": url,
+                "chunk_number": number,
+                "title": chunks[0]["title"],
+                "summary": "",
+                "content": chunk.text(markdown),
+                "metadata": chunks[0]["metadata"]
+            })
+    return rows
+
+def reciprocal_rank(results: List[Dict[str, Any]], relevant_urls: List[str]) -> float:
+    for rank, row in enumerate(results, start=1):
+        if row["url"] in relevant_urls:
+            return 1 / rank
+    return 0.0
+
+def recall_at_k(results: List[Dict[str, Any]], relevant_urls: List[str], k: int) -> float:
+    found = {row["url"] for row in results[:k]}
+    return sum(url in found for url in relevant_urls) / len(relevant_urls)
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+async def run_mode(
+    mode: str,
+    deps: PydanticAIDeps,
+    queries: List[Dict[str, Any]],
+    repeat: int
+) -> Dict[str, Any]:
+    """Replay every query through retrieve_relevant_documentation `repeat` times."""
+    agent.retrieval_mode = mode
+    # Each mode starts with cold query embeddings
+    agent.query_embedding_cache = QueryEmbeddingCache()
+    ctx = BenchmarkContext(deps)
+
+    latencies, sizes, errors = [], [], 0
+    recalls = {k: [] for k in (1, 3, 5)}
+    reciprocal_ranks = []
+    for iteration in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            # The context budget prints its savings on every call
+            with redirect_stdout(io.StringIO()):
+                output = await retrieve_relevant_documentation(ctx, query["query"])
+            latencies.append(time.perf_counter() - start)
+            sizes.append(len(output.encode("utf-8")))
+            if output.startswith("Error retrieving documentation"):
+                errors += 1
+            if iteration == 0:
+                matches = deps.vector_index.last_matches
+                for k in recalls:
+                    recalls[k].append(recall_at_k(matches, query["relevant_urls"], k))
+                reciprocal_ranks.append(reciprocal_rank(matches, query["relevant_urls"]))
+
+    return {
+        **{f"recall@{k}": float(np.mean(values)) for k, values in recalls.items()},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "bytes_mean": float(np.mean(sizes)),
+        "bytes_p95": float(np.percentile(sizes, 95)),
+        "calls": len(latencies),
+        "errors": errors
+    }
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """Print each metric's change since a previous report; returns False if retrieval quality dropped."""
+    print(f"\nCompared with {previous.get('commit') or 'previous run'} ({previous.get('created_at', '?')}):")
+    ok = True
+    for mode, metrics in current["results"].items():
+        before = previous.get("results", {}).get(mode)
+        if before is None:
+            print(f"  {mode}: not in the previous report")
+            continue
+        for name, value in metrics.items():
+            if name not in before or name in ("calls", "errors"):
+                continue
+            delta = value - before[name]
+            regressed = name in QUALITY_METRICS and delta < -1e-9
+            ok = ok and not regressed
+            print(f"  {mode:<8}{name:<12}{before[name]:>12.3f} -> {value:<12.3f}{delta:+.3f}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Replay the fixture queries through retrieve_relevant_documentation offline and report retrieval quality and latency."
+    )
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="JSON file with a corpus and queries with relevant URLs")
+    parser.add_argument("--modes", nargs="+", choices=["vector", "hybrid"], default=["vector", "hybrid"])
+    parser.add_argument("--repeat", type=int, default=5, help="Times each query is replayed for the latency percentiles")
+    parser.add_argument("--chunk-max-tokens", type=int, default=0, help="Re-chunk the fixture pages with this chunk size (0 keeps the fixture chunks)")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=0)
+    parser.add_argument("--context-tokens", type=int, default=int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "2000")), help="The RAG tool's token budget")
+    parser.add_argument("--precision", choices=["float32", "float16", "int8"], default="float32", help="Precision of the local index")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Previous JSON report to compare with; exits with status 1 if recall or MRR dropped")
+    args = parser.parse_args()
+
+    with open(args.fixtures, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    corpus = fixtures["corpus"]
+    if args.chunk_max_tokens:
+        corpus = rechunk(corpus, args.chunk_max_tokens, args.chunk_overlap_tokens)
+
+    index = RecordingIndex(os.path.join(tempfile.mkdtemp(), "index"), precision=args.precision)
+    index.replace(corpus, [hashing_embedding(f"{row['title']}\n{row['content']}") for row in corpus])
+    agent.context_budget = ContextBudget(max_tokens=args.context_tokens)
+    deps = PydanticAIDeps(
+        supabase=None,
+        openai_client=SimpleNamespace(embeddings=HashingEmbeddings()),
+        vector_index=index
+    )
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "fixtures": os.path.basename(args.fixtures),
+            "corpus_chunks": len(corpus),
+            "queries": len(fixtures["queries"]),
+            "repeat": args.repeat,
+            "chunk_max_tokens": args.chunk_max_tokens,
+            "chunk_overlap_tokens": args.chunk_overlap_tokens,
+            "context_tokens": args.context_tokens,
+            "precision": args.precision,
+            "embeddings": "hashing"
+        },
+        "results": {}
+    }
+    for mode in args.modes:
+        report["results"][mode] = await run_mode(mode, deps, fixtures["queries"], args.repeat)
+
+    print(f"{len(fixtures['queries'])} queries x {args.repeat} against {len(corpus)} fixture chunks")
+    print(
+        f"{'mode':<8}{'recall@1':>10}{'recall@3':>10}{'recall@5':>10}{'mrr':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>9}{'errors':>8}"
+    )
+    for mode, metrics in report["results"].items():
+        print(
+            f"{mode:<8}{metrics['recall@1']:>10.3f}{metrics['recall@3']:>10.3f}{metrics['recall@5']:>10.3f}"
+            f"{metrics['mrr']:>8.3f}{metrics['p50_ms']:>9.2f}{metrics['p95_ms']:>9.2f}{metrics['p99_ms']:>9.2f}"
+            f"{metrics['bytes_mean']:>9.0f}{metrics['errors']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        if not compare(previous, report):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import argparse
+from typing import Any, Awaitable, Callable, List
+
+from dotenv import load_dotenv
+from supabase import Client
+
+from site_pages_store import SitePagesStore
+
+class SimulatedQuery:
+    """Stand-in for a supabase-py query builder whose execute() blocks for one network round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def __getattr__(self, name: str) -> Callable[..., "SimulatedQuery"]:
+        # select(), eq(), order(), ... just keep building the query
+        return lambda *args, **kwargs: self
+
+    def execute(self) -> Any:
+        time.sleep(self.latency)
+        return type("Response", (), {"data": [{"url": "https://ai.pydantic.dev/", "title": "Pydantic AI", "content": "", "chunk_number": 0}]})()
+
+class SimulatedSupabase:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def from_(self, table: str) -> SimulatedQuery:
+        return SimulatedQuery(self.latency)
+
+    def rpc(self, name: str, params: dict) -> SimulatedQuery:
+        return SimulatedQuery(self.latency)
+
+async def blocking_page_chunks(supabase: Any, url: str) -> List[Any]:
+    """How the agent tools queried Supabase before: a blocking execute() inside an async function."""
+    return supabase.from_('site_pages') \
+        .select('title, content, chunk_number') \
+        .eq('url', url) \
+        .eq('metadata->>source', 'pydantic_ai_docs') \
+        .order('chunk_number') \
+        .execute().data
+
+async def measure(name: str, call: Callable[[], Awaitable[Any]], requests: int, concurrency: int):
+    """Run `requests` calls, `concurrency` at a time, while sampling event loop lag."""
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def monitor():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    monitor_task = asyncio.create_task(monitor())
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await monitor_task
+
+    print(
+        f"{name:<10}{concurrency:>13}{requests / elapsed:>14.1f}"
+        f"{elapsed / requests * concurrency * 1000:>16.0f}{max(lags, default=0) * 1000:>16.0f}"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare blocking supabase-py calls with SitePagesStore under concurrency.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated round trip in seconds")
+    parser.add_argument("--live", action="store_true", help="Query the Supabase project from .env instead of a simulated one")
+    parser.add_argument("--url", default="https://ai.pydantic.dev/", help="Page to fetch in --live mode")
+    args = parser.parse_args()
+
+    if args.live:
+        load_dotenv()
+        supabase = Client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    else:
+        supabase = SimulatedSupabase(args.latency)
+    store = SitePagesStore(supabase)
+
+    print(f"{'mode':<10}{'concurrency':>13}{'requests/s':>14}{'avg latency ms':>16}{'max loop lag ms':>16}")
+    for concurrency in args.concurrency:
+        await measure("blocking", lambda: blocking_page_chunks(supabase, args.url), args.requests, concurrency)
+        await measure("store", lambda: store.page_chunks(args.url, 'pydantic_ai_docs'), args.requests, concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Approximate characters per token when tiktoken isn't available
+CHARS_PER_TOKEN = 4
+
+# Break point priorities, higher is a better place to end a chunk
+HEADING = 3
+FENCE_END = 2
+PARAGRAPH = 1
+
+# Line starts that matter for chunking: code fences, headings and blank lines
+STRUCTURE_PATTERN = re.compile(r"^[ \t]*(?:(```|~~~)|(#{1,6}[ \t])|$)", re.MULTILINE)
+
+@dataclass
+class Chunk:
+    """A chunk of a document, stored as character offsets into the original text."""
+    start: int
+    end: int
+    token_count: int
+
+    def text(self, document: str) -> str:
+        return document[self.start:self.end]
+
+class TokenCounter:
+    """Counts tokens between any two character offsets of a document in O(log n)."""
+
+    def __init__(self, text: str, encoding_name: Optional[str] = "cl100k_base"):
+        self.length = len(text)
+        self._token_starts = None
+        if tiktoken is not None and encoding_name:
+            encoding = tiktoken.get_encoding(encoding_name)
+            _, self._token_starts = encoding.decode_with_offsets(
+                encoding.encode(text, disallowed_special=())
+            )
+
+    def count(self, start: int, end: int) -> int:
+        if self._token_starts is None:
+            return -(-(end - start) // CHARS_PER_TOKEN)
+        return bisect_left(self._token_starts, end) - bisect_left(self._token_starts, start)
+
+    def offset_after(self, start: int, tokens: int) -> int:
+        """Character offset reached after `tokens` tokens starting at `start`."""
+        if self._token_starts is None:
+            return min(start + tokens * CHARS_PER_TOKEN, self.length)
+        index = bisect_left(self._token_starts, start) + tokens
+        return self._token_starts[index] if index < len(self._token_starts) else self.length
+
+    def offset_before(self, end: int, tokens: int) -> int:
+        """Character offset `tokens` tokens before `end`."""
+        if self._token_starts is None:
+            return max(end - tokens * CHARS_PER_TOKEN, 0)
+        index = bisect_right(self._token_starts, end) - 1 - tokens
+        return self._token_starts[index] if index > 0 else 0
+
+def find_break_points(text: str) -> Dict[int, List[int]]:
+    """
+    Scan the document once and return the sorted offsets of structural break points by priority.
+
+    Headings, the start and end of fenced code blocks and paragraph starts are
+    break points, except inside a fenced code block.
+    """
+    breaks = {HEADING: [], FENCE_END: [], PARAGRAPH: []}
+    in_fence = False
+    fence = ""
+    length = len(text)
+
+    for match in STRUCTURE_PATTERN.finditer(text):
+        line_start = match.start()
+        marker, heading = match.group(1), match.group(2)
+
+        if marker:
+            if not in_fence:
+                in_fence, fence = True, marker
+                if line_start > 0:
+                    breaks[PARAGRAPH].append(line_start)
+            elif marker == fence:
+                in_fence = False
+                # The line after a closing fence is a good place to split
+                next_line = text.find("\n", match.end())
+                if next_line != -1 and next_line + 1 < length:
+                    breaks[FENCE_END].append(next_line + 1)
+        elif in_fence:
+            continue
+        elif heading:
+            if line_start > 0:
+                breaks[HEADING].append(line_start)
+        elif match.end() + 1 < length:
+            # Blank line: the paragraph starts on the next line
+            breaks[PARAGRAPH].append(match.end() + 1)
+
+    return breaks
+
+def _strip_span(text: str, start: int, end: int) -> tuple:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = 1200,
+    overlap_tokens: int = 0,
+    min_fill: float = 0.3,
+    encoding_name: Optional[str] = "cl100k_base"
+) -> List[Chunk]:
+    """
+    Split markdown into chunks of at most `max_tokens` tokens in a single pass.
+
+    Chunks end at the best break point (heading, end of a code block, paragraph,
+    then line or sentence) found after `min_fill` of the token budget. Nothing is copied while
+    chunking: chunks are returned as offsets into `text`, stripped of
+    surrounding whitespace. Consecutive chunks share `overlap_tokens` tokens,
+    but never more than half of the earlier chunk, so every chunk moves at
+    least half its length past the previous one and the number of chunks
+    stays linear in the size of the text.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+    counter = TokenCounter(text, encoding_name)
+    breaks = find_break_points(text)
+    chunks = []
+    start = 0
+    length = len(text)
+
+    while start < length:
+        limit = counter.offset_after(start, max_tokens)
+        if limit >= length:
+            end = length
+        else:
+            # The last break point of the best priority between min_end and limit
+            min_end = max(counter.offset_after(start, int(max_tokens * min_fill)), start + 1)
+            best_offset = None
+            for priority in (HEADING, FENCE_END, PARAGRAPH):
+                offsets = breaks[priority]
+                i = bisect_right(offsets, limit) - 1
+                if i >= 0 and offsets[i] >= min_end:
+                    best_offset = offsets[i]
+                    break
+
+            if best_offset is not None:
+                end = best_offset
+            else:
+                # No structural break, fall back to a line, then a sentence, then a hard cut.
+                # rfind with bounds searches the document in place without copying it
+                line_break = text.rfind("\n", min_end, limit)
+                sentence_break = text.rfind(". ", min_end, limit)
+                if line_break != -1:
+                    end = line_break + 1
+                elif sentence_break != -1:
+                    end = sentence_break + 1
+                else:
+                    end = limit
+            if end <= start:
+                end = limit if limit > start else start + 1
+
+        chunk_start, chunk_end = _strip_span(text, start, end)
+        if chunk_end > chunk_start:
+            chunks.append(Chunk(chunk_start, chunk_end, counter.count(chunk_start, chunk_end)))
+
+        if end >= length:
+            break
+        if overlap_tokens:
+            overlap = min(overlap_tokens, counter.count(start, end) // 2)
+            start = max(counter.offset_before(end, overlap), start + 1) if overlap else end
+        else:
+            start = end
+
+    return chunks
@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from chunker import TokenCounter, find_break_points
+from dedup_index import simhash
+from hybrid_search import BM25Index
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+GAP_MARKER = "[...]"
+
+# Approximate tokens added around kept text: blank lines and gap markers per
+# passage, the separator per chunk
+PER_PASSAGE_OVERHEAD = 4
+PER_CHUNK_OVERHEAD = 6
+
+@dataclass
+class Passage:
+    """A paragraph, heading or code block of a retrieved chunk."""
+    chunk_rank: int
+    position: int
+    text: str
+    tokens: int
+    score: float = 0.0
+
+def format_chunks(chunks: List[Dict[str, Any]]) -> str:
+    """Format retrieved chunks the way the RAG tool always has: title heading, content, separators."""
+    return CHUNK_SEPARATOR.join(f"\n# {chunk['title']}\n\n{chunk['content']}\n" for chunk in chunks)
+
+def split_passages(content: str, chunk_rank: int) -> List[Passage]:
+    """Split a chunk at headings, paragraphs and code block ends, never inside a code block."""
+    boundaries = sorted({0, len(content), *(offset for offsets in find_break_points(content).values() for offset in offsets)})
+    counter = TokenCounter(content)
+    passages = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        text = content[start:end].strip()
+        if text:
+            passages.append(Passage(chunk_rank, len(passages), text, counter.count(start, end)))
+    return passages
+
+def truncate_passage(passage: Passage, max_tokens: int) -> Passage:
+    """Cut a passage to at most `max_tokens` tokens, marking the cut and closing a code block it splits."""
+    counter = TokenCounter(passage.text)
+    # Leave room for a closing fence and the gap marker
+    suffix = f"\n```\n{GAP_MARKER}"
+    end = counter.offset_after(0, max(max_tokens - TokenCounter(suffix).count(0, len(suffix)), 0))
+    text = passage.text[:end].rstrip()
+    if text.count("```") % 2:
+        text += "\n```"
+    return Passage(passage.chunk_rank, passage.position, f"{text}\n{GAP_MARKER}", counter.count(0, end), passage.score)
+
+class ContextBudget:
+    """
+    Fits retrieved chunks into a token budget before they go back to the model.
+
+    Each chunk is split into passages (paragraphs, headings, whole code blocks),
+    which are scored by relevance to the query, lexically with BM25 or, when
+    fit() is given an `embed` function, by cosine similarity with the query
+    embedding, weighted by a prior for the chunk's retrieval rank. The best passages that fit the budget
+    are kept, skipping (near-)duplicates from overlapping chunks, and rendered
+    in their original order under their chunk's title.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        rank_weight: float = 0.3
+    ):
+        self.max_tokens = max_tokens
+        self.rank_weight = rank_weight
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    async def _relevance(
+        self,
+        query: str,
+        passages: List[Passage],
+        query_embedding: Optional[List[float]],
+        embed: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]]
+    ) -> np.ndarray:
+        if embed is not None and query_embedding is not None:
+            try:
+                vectors = np.array(await embed([passage.text for passage in passages]), dtype=np.float32)
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1)
+                return (vectors @ query_vector) / np.where(norms == 0, 1, norms)
+            except Exception as e:
+                # Retrieval already succeeded, so trim with BM25 rather than fail the tool
+                print(f"Error embedding passages, scoring them lexically: {e}")
+        scores = BM25Index([passage.text for passage in passages]).scores(query)
+        return scores / scores.max() if scores.max() > 0 else scores
+
+    async def fit(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None,
+        embed: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None
+    ) -> str:
+        """
+        Return the chunks formatted for the model, trimmed to at most `max_tokens` tokens.
+
+        Args:
+            query: The user's query
+            chunks: Retrieved rows with title and content, best match first
+            query_embedding: The query's embedding
+            embed: Embeds a list of passages in one request; without it, or if it fails, passages are scored with BM25
+
+        Returns:
+            str: The formatted context, unchanged if it already fits the budget. If no
+            passage fits, the best one is kept, cut to the budget
+        """
+        original = format_chunks(chunks)
+        original_tokens = TokenCounter(original).count(0, len(original))
+        self.calls += 1
+        self.tokens_in += original_tokens
+        if not self.max_tokens or original_tokens <= self.max_tokens:
+            self.tokens_out += original_tokens
+            return original
+
+        passages = [passage for rank, chunk in enumerate(chunks) for passage in split_passages(chunk['content'], rank)]
+        if not passages:
+            # Only titles, nothing to trim
+            self.tokens_out += original_tokens
+            return original
+        relevance = await self._relevance(query, passages, query_embedding, embed)
+        if relevance.max() <= 0:
+            # Nothing matches the query's terms, fall back to the leading passages of the best chunks
+            relevance = np.ones(len(passages), dtype=np.float32)
+        for passage, score in zip(passages, relevance):
+            prior = 1 - passage.chunk_rank / len(chunks)
+            passage.score = float(score) * (1 - self.rank_weight + self.rank_weight * prior)
+
+        # Greedily keep the best passages that still fit, counting each chunk's title and separator once
+        headers = [f"# {chunk['title']}" for chunk in chunks]
+        title_tokens = [TokenCounter(header).count(0, len(header)) + PER_CHUNK_OVERHEAD for header in headers]
+        used = 0
+        selected: Dict[int, List[Passage]] = {}
+        fingerprints: List[int] = []
+        for passage in sorted(passages, key=lambda p: (-p.score, p.chunk_rank, p.position)):
+            if passage.score <= 0:
+                break
+            cost = passage.tokens + PER_PASSAGE_OVERHEAD + (0 if passage.chunk_rank in selected else title_tokens[passage.chunk_rank])
+            if used + cost > self.max_tokens:
+                continue
+            fingerprint = simhash(passage.text)
+            if any(bin(fingerprint ^ seen).count("1") <= 3 for seen in fingerprints):
+                continue
+            fingerprints.append(fingerprint)
+            selected.setdefault(passage.chunk_rank, []).append(passage)
+            used += cost
+
+        if not selected:
+            # Not even the best passage fits, keep it cut to the budget rather than return nothing
+            best = min(passages, key=lambda p: (-p.score, p.chunk_rank, p.position))
+            selected[best.chunk_rank] = [truncate_passage(best, self.max_tokens - title_tokens[best.chunk_rank] - PER_PASSAGE_OVERHEAD)]
+
+        formatted = []
+        for rank in sorted(selected):
+            kept = sorted(selected[rank], key=lambda p: p.position)
+            parts = [f"# {chunks[rank]['title']}"]
+            for previous, passage in zip([None] + kept, kept):
+                if previous is not None and passage.position != previous.position + 1:
+                    parts.append(GAP_MARKER)
+                parts.append(passage.text)
+            formatted.append("\n" + "\n\n".join(parts) + "\n")
+        trimmed = CHUNK_SEPARATOR.join(formatted)
+
+        tokens = TokenCounter(trimmed).count(0, len(trimmed))
+        self.tokens_out += tokens
+        print(f"Retrieval context: {original_tokens} -> {tokens} tokens ({original_tokens - tokens} saved)")
+        return trimmed
+
+    def summary(self) -> str:
+        """Return a one-line summary of the tokens saved so far."""
+        saved = self.tokens_in - self.tokens_out
+        return (
+            f"Retrieval context budget: {self.calls} calls, {self.tokens_in} -> {self.tokens_out} tokens "
+            f"({saved} saved, {saved / self.calls if self.calls else 0:.0f} per call)"
+        )
@@ -0,0 +1,173 @@
+import json
+import time
+import sqlite3
+from typing import Any, Dict, List, Optional, Set
+from dataclasses import dataclass
+
+# Page-level states, in the order a page goes through them
+QUEUED = "queued"
+FETCHED = "fetched"
+CHUNKED = "chunked"
+STORED = "stored"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Chunk-level states
+SUMMARIZED = "summarized"
+EMBEDDED = "embedded"
+
+@dataclass
+class FetchedPage:
+    url: str
+    markdown: str
+    markdown_hash: str
+    headers: Dict[str, str]
+
+class CheckpointJournal:
+    """
+    Durable, append-only SQLite journal of a crawl's progress.
+
+    Every state transition (queued, fetched, chunked, stored, plus summarized,
+    embedded and stored for individual chunks) is appended as an event, and the
+    rendered markdown of fetched pages is kept so a resumed run doesn't need the
+    browser for them. Summaries and embeddings themselves come back from the
+    ingest cache on resume; the journal only records that they were produced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.executescript("""
+            create table if not exists runs (
+                id integer primary key autoincrement,
+                started_at real not null,
+                options text not null
+            );
+            create table if not exists events (
+                id integer primary key autoincrement,
+                run_id integer not null,
+                url text not null,
+                chunk_number integer,
+                state text not null,
+                detail text,
+                created_at real not null
+            );
+            create index if not exists idx_events_url on events (run_id, url);
+            create table if not exists fetched_pages (
+                run_id integer not null,
+                url text not null,
+                markdown text not null,
+                markdown_hash text not null,
+                headers text not null,
+                primary key (run_id, url)
+            );
+        """)
+        self._conn.commit()
+        row = self._conn.execute("select id from runs order by id desc limit 1").fetchone()
+        self.run_id = row[0] if row else None
+
+    def start_run(
+        self,
+        lastmods: Dict[str, Optional[str]],
+        options: Dict[str, Any],
+        sources: Optional[Dict[str, str]] = None
+    ):
+        """Start a new run for these URLs (with their source names), discarding the previous run's journal."""
+        sources = sources or {}
+        self._conn.execute("delete from events")
+        self._conn.execute("delete from fetched_pages")
+        self._conn.execute("delete from runs")
+        cursor = self._conn.execute(
+            "insert into runs (started_at, options) values (?, ?)",
+            (time.time(), json.dumps(options))
+        )
+        self.run_id = cursor.lastrowid
+        now = time.time()
+        self._conn.executemany(
+            "insert into events (run_id, url, chunk_number, state, detail, created_at) values (?, ?, null, ?, ?, ?)",
+            [
+                (self.run_id, url, QUEUED, json.dumps({"lastmod": lastmod, "source": sources.get(url)}), now)
+                for url, lastmod in lastmods.items()
+            ]
+        )
+        self._conn.commit()
+
+    def run_options(self) -> Dict[str, Any]:
+        """Options the last run was started with."""
+        row = self._conn.execute("select options from runs where id = ?", (self.run_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def record(self, url: str, state: str, chunk_number: Optional[int] = None, detail: Optional[Dict[str, Any]] = None):
+        """Append a state transition for a page, or for one of its chunks."""
+        self.record_many([(url, chunk_number)], state, detail)
+
+    def record_many(self, keys: List[tuple], state: str, detail: Optional[Dict[str, Any]] = None):
+        """Append the same state transition for several (url, chunk_number) pairs in one commit."""
+        now = time.time()
+        detail_json = json.dumps(detail) if detail else None
+        self._conn.executemany(
+            "insert into events (run_id, url, chunk_number, state, detail, created_at) values (?, ?, ?, ?, ?, ?)",
+            [(self.run_id, url, chunk_number, state, detail_json, now) for url, chunk_number in keys]
+        )
+        self._conn.commit()
+
+    def record_fetched(self, url: str, markdown: str, markdown_hash: str, headers: Dict[str, str]):
+        """Keep a fetched page's markdown so a resumed run can skip re-rendering it."""
+        self._conn.execute(
+            "insert or replace into fetched_pages (run_id, url, markdown, markdown_hash, headers) values (?, ?, ?, ?, ?)",
+            (self.run_id, url, markdown, markdown_hash, json.dumps(headers))
+        )
+        self.record(url, FETCHED)
+
+    def finish_page(self, url: str, state: str = STORED):
+        """Mark a page as done and drop its saved markdown."""
+        self._conn.execute("delete from fetched_pages where run_id = ? and url = ?", (self.run_id, url))
+        self.record(url, state)
+
+    def pending_urls(self) -> Dict[str, Optional[str]]:
+        """URLs of the last run (with their sitemap lastmod) that were not finished."""
+        queued = {}
+        for url, detail in self._conn.execute(
+            "select url, detail from events where run_id = ? and state = ? and chunk_number is null order by id",
+            (self.run_id, QUEUED)
+        ):
+            queued[url] = json.loads(detail).get("lastmod") if detail else None
+
+        finished = {
+            row[0] for row in self._conn.execute(
+                "select distinct url from events where run_id = ? and chunk_number is null and state in (?, ?)",
+                (self.run_id, STORED, SKIPPED)
+            )
+        }
+        return {url: lastmod for url, lastmod in queued.items() if url not in finished}
+
+    def url_sources(self) -> Dict[str, Optional[str]]:
+        """Source name of each URL of the last run, None for runs journaled before sources existed."""
+        return {
+            url: json.loads(detail).get("source") if detail else None
+            for url, detail in self._conn.execute(
+                "select url, detail from events where run_id = ? and state = ? and chunk_number is null",
+                (self.run_id, QUEUED)
+            )
+        }
+
+    def fetched_page(self, url: str) -> Optional[FetchedPage]:
+        row = self._conn.execute(
+            "select url, markdown, markdown_hash, headers from fetched_pages where run_id = ? and url = ?",
+            (self.run_id, url)
+        ).fetchone()
+        return FetchedPage(row[0], row[1], row[2], json.loads(row[3])) if row else None
+
+    def stored_chunks(self, url: str) -> Set[int]:
+        """Chunk numbers of a page that already made it into site_pages."""
+        return {
+            row[0] for row in self._conn.execute(
+                "select chunk_number from events where run_id = ? and url = ? and state = ? and chunk_number is not null",
+                (self.run_id, url, STORED)
+            )
+        }
+
+    def close(self):
+        self._conn.close()
@@ -2,27 +2,128 @@ import os
 import sys
 import json
 import asyncio
+import argparse
 import requests
+from concurrent.futures import ProcessPoolExecutor
 from xml.etree import ElementTree
-from typing import List, Dict, Any
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set, Tuple
+from itertools import zip_longest
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
+import httpx
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from openai import AsyncOpenAI
 from supabase import create_client, Client
 
+from embedding_batcher import EmbeddingBatcher
+from rate_limiter import AdaptiveLimiter
+from ingest_cache import IngestCache, content_hash
+from crawl_state import CrawlState, PageState
+from site_pages_writer import SitePagesWriter
+from ingest_pipeline import IngestPipeline, Stage
+from doc_processing import process_document
+from dedup_index import DedupIndex, Canonical
+from crawl_checkpoint import CheckpointJournal, CHUNKED, SUMMARIZED, EMBEDDED, STORED, SKIPPED, FAILED
+from sources import Source, DEFAULT_SOURCE, DEFAULT_SOURCES, load_sources
+
 load_dotenv()
 
+llm_model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+embedding_model = "text-embedding-3-small"
+
+# Documentation sites to crawl, with their sitemaps, chunking and embedding models
+sources = load_sources()
+
 # Initialize OpenAI and Supabase clients
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are left to openai_limiter so it sees every 429
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 supabase: Client = create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_SERVICE_KEY")
 )
 
+# Adaptive concurrency limit and retries shared by the summary and embedding calls
+openai_limiter = AdaptiveLimiter(
+    initial_limit=int(os.getenv("OPENAI_INITIAL_CONCURRENCY", "8")),
+    max_limit=int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")),
+    max_attempts=int(os.getenv("OPENAI_MAX_ATTEMPTS", "6"))
+)
+
+# Chunks from every document being processed share these embedding batches, one batcher per embedding model
+embedding_batchers: Dict[str, EmbeddingBatcher] = {}
+
+def get_embedding_batcher(model: str) -> EmbeddingBatcher:
+    if model not in embedding_batchers:
+        embedding_batchers[model] = EmbeddingBatcher(
+            openai_client,
+            model=model,
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("EMBEDDING_FLUSH_INTERVAL", "0.05")),
+            max_concurrent_requests=int(os.getenv("EMBEDDING_MAX_CONCURRENT_REQUESTS", "4")),
+            limiter=openai_limiter
+        )
+    return embedding_batchers[model]
+
+# Titles, summaries and embeddings of chunks we've already processed, so re-crawls only pay for what changed
+ingest_cache = IngestCache(
+    os.getenv("INGEST_CACHE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_cache.sqlite"),
+    max_entries=int(os.getenv("INGEST_CACHE_MAX_ENTRIES", "100000"))
+)
+
+# Buffers processed chunks and upserts them into site_pages in batches
+site_pages_writer = SitePagesWriter(
+    supabase,
+    batch_size=int(os.getenv("SITE_PAGES_WRITE_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("SITE_PAGES_WRITE_FLUSH_INTERVAL", "2.0"))
+)
+
+# What each URL looked like when it was last ingested, used by --incremental crawls
+crawl_state = CrawlState(
+    os.getenv("CRAWL_STATE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".crawl_state.sqlite"),
+    default_source=DEFAULT_SOURCE
+)
+
+# Durable journal of the current run's progress, used by --resume
+checkpoint_journal = CheckpointJournal(
+    os.getenv("CHECKPOINT_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".crawl_checkpoint.sqlite")
+)
+
+# Exact and near-duplicate chunks within each source. Duplicates are either
+# skipped ("skip") or stored without an embedding as a reference to the canonical row ("reference")
+dedup_mode = os.getenv("DEDUP_MODE", "reference")
+dedup_index_path = os.getenv("DEDUP_INDEX_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dedup_index.sqlite")
+dedup_indexes: Dict[str, DedupIndex] = {}
+
+def get_dedup_index(source: str) -> Optional[DedupIndex]:
+    """
+    The dedup index of a source. Sources are kept apart so a duplicate never
+    points at a canonical row that the source's searches can't see.
+    """
+    if dedup_mode == "off":
+        return None
+    if source not in dedup_indexes:
+        # The default source keeps the original file, so indexes from before sources existed stay valid
+        root, extension = os.path.splitext(dedup_index_path)
+        path = dedup_index_path if source == DEFAULT_SOURCE else f"{root}.{source}{extension}"
+        dedup_indexes[source] = DedupIndex(path, max_distance=int(os.getenv("DEDUP_MAX_DISTANCE", "3")))
+    return dedup_indexes[source]
+
+# Chunk size in embedding tokens, and how many tokens consecutive chunks share, for sources that don't set their own
+chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "1200"))
+chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+
+# Workers per ingestion stage (the crawl stage uses crawl_parallel's max_concurrent)
+summarize_workers = int(os.getenv("SUMMARIZE_WORKERS", "10"))
+embed_workers = int(os.getenv("EMBED_WORKERS", "100"))
+write_workers = int(os.getenv("WRITE_WORKERS", "4"))
+pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+
+# Worker processes for markdown cleanup, chunking and hashing (0 runs them on the event loop)
+process_pool_workers = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+
 @dataclass
 class ProcessedChunk:
     url: str
@@ -31,52 +132,33 @@ class ProcessedChunk:
     summary: str
     content: str
     metadata: Dict[str, Any]
-    embedding: List[float]
-
-def chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
-    """Split text into chunks, respecting code blocks and paragraphs."""
-    chunks = []
-    start = 0
-    text_length = len(text)
-
-    while start < text_length:
-        # Calculate end position
-        end = start + chunk_size
-
-        # If we're at the end of the text, just take what's left
-        if end >= text_length:
-            chunks.append(text[start:].strip())
-            break
-
-        # Try to find a code block boundary first (```)
-        chunk = text[start:end]
-        code_block = chunk.rfind('```')
-        if code_block != -1 and code_block > chunk_size * 0.3:
-            end = start + code_block
-
-        # If no code block, try to break at a paragraph
-        elif '\n\n' in chunk:
-            # Find the last paragraph break
-            last_break = chunk.rfind('\n\n')
-            if last_break > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
-                end = start + last_break
-
-        # If no paragraph break, try to break at a sentence
-        elif '. ' in chunk:
-            # Find the last sentence break
-            last_period = chunk.rfind('. ')
-            if last_period > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
-                end = start + last_period + 1
-
-        # Extract chunk and clean it up
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        # Move start position for next chunk
-        start = max(start + 1, end)
-
-    return chunks
+    embedding: Optional[List[float]]
+
+@dataclass
+class PageJob:
+    """A crawled page moving through the ingestion pipeline."""
+    url: str
+    markdown: str
+    markdown_hash: str
+    headers: Dict[str, str]
+    source: Source
+    lastmod: Optional[str] = None
+    remaining_chunks: int = 0
+    # Chunk numbers the page has in site_pages once it is stored
+    chunk_numbers: Set[int] = field(default_factory=set)
+
+@dataclass
+class ChunkJob:
+    """A chunk of a crawled page, filled in stage by stage."""
+    page: PageJob
+    chunk_number: int
+    content: str
+    start: int
+    end: int
+    content_hash: Optional[str] = None
+    duplicate_of: Optional[Canonical] = None
+    extracted: Optional[Dict[str, str]] = None
+    embedding: Optional[List[float]] = None
 
 async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
     """Extract title and summary using GPT-4."""
@@ -86,47 +168,81 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
     For the summary: Create a concise summary of the main points in this chunk.
     Keep both title and summary concise but informative."""
     
-    try:
-        response = await openai_client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+    # Rate limits and transient errors are retried by the limiter, anything left raises
+    response = await openai_limiter.call(
+        lambda: openai_client.chat.completions.with_raw_response.create(
+            model=llm_model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
             ],
             response_format={ "type": "json_object" }
         )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"Error getting title and summary: {e}")
-        return {"title": "Error processing title", "summary": "Error processing summary"}
+    )
+    return json.loads(response.choices[0].message.content)
 
-async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+async def get_embedding(text: str, model: str = embedding_model) -> List[float]:
+    """Get embedding vector from OpenAI, batched with other in-flight chunks."""
+    return await get_embedding_batcher(model).embed(text)
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
-    # Get title and summary
-    extracted = await get_title_and_summary(chunk, url)
-    
-    # Get embedding
-    embedding = await get_embedding(chunk)
-    
+async def summarize_chunk(chunk: str, url: str, digest: Optional[str] = None) -> Dict[str, str]:
+    """Get title and summary, reusing the cached ones if this chunk was seen before."""
+    extracted = ingest_cache.get_summary(chunk, llm_model, digest)
+    if extracted is None:
+        extracted = await get_title_and_summary(chunk, url)
+        ingest_cache.set_summary(chunk, llm_model, extracted, digest)
+    return extracted
+
+async def embed_chunk(chunk: str, digest: Optional[str] = None, model: str = embedding_model) -> List[float]:
+    """Get the chunk's embedding, reusing the cached one if this chunk was seen before."""
+    embedding = ingest_cache.get_embedding(chunk, model, digest)
+    if embedding is None:
+        embedding = await get_embedding(chunk, model)
+        ingest_cache.set_embedding(chunk, model, embedding, digest)
+    return embedding
+
+def build_duplicate_chunk(
+    chunk: str,
+    chunk_number: int,
+    url: str,
+    canonical: Canonical,
+    span: Optional[Tuple[int, int]] = None,
+    source: str = DEFAULT_SOURCE
+) -> ProcessedChunk:
+    """Build a site_pages row that points at the canonical copy of a duplicate chunk instead of being embedded."""
+    # The canonical chunk's title and summary are usually in the ingest cache already
+    extracted = ingest_cache.get_summary(None, llm_model, canonical.content_hash) or {
+        "title": f"Duplicate of {canonical.url}",
+        "summary": f"Same content as chunk {canonical.chunk_number} of {canonical.url}"
+    }
+    processed = build_processed_chunk(chunk, chunk_number, url, extracted, None, span, source)
+    processed.metadata["duplicate_of"] = {
+        "url": canonical.url,
+        "chunk_number": canonical.chunk_number,
+        "exact": canonical.exact
+    }
+    return processed
+
+def build_processed_chunk(
+    chunk: str,
+    chunk_number: int,
+    url: str,
+    extracted: Dict[str, str],
+    embedding: Optional[List[float]],
+    span: Optional[Tuple[int, int]] = None,
+    source: str = DEFAULT_SOURCE
+) -> ProcessedChunk:
+    """Combine a chunk with its title, summary and embedding."""
     # Create metadata
     metadata = {
-        "source": "pydantic_ai_docs",
+        "source": source,
         "chunk_size": len(chunk),
         "crawled_at": datetime.now(timezone.utc).isoformat(),
         "url_path": urlparse(url).path
     }
+    if span:
+        # Character offsets of the chunk within the page's markdown
+        metadata["chunk_start"], metadata["chunk_end"] = span
     
     return ProcessedChunk(
         url=url,
@@ -139,46 +255,73 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
     )
 
 async def insert_chunk(chunk: ProcessedChunk):
-    """Insert a processed chunk into Supabase."""
+    """Queue a processed chunk to be upserted into Supabase."""
+    await site_pages_writer.add(chunk)
+
+async def delete_page_chunks(url: str, source: Optional[str] = None):
+    """Delete all stored chunks for a URL, only within `source` if given."""
     try:
-        data = {
-            "url": chunk.url,
-            "chunk_number": chunk.chunk_number,
-            "title": chunk.title,
-            "summary": chunk.summary,
-            "content": chunk.content,
-            "metadata": chunk.metadata,
-            "embedding": chunk.embedding
-        }
-        
-        result = supabase.table("site_pages").insert(data).execute()
-        print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
-        return result
+        query = supabase.table("site_pages").delete().eq("url", url)
+        if source:
+            query = query.eq("metadata->>source", source)
+        await asyncio.to_thread(query.execute)
+        print(f"Deleted chunks for {url}")
     except Exception as e:
-        print(f"Error inserting chunk: {e}")
-        return None
+        print(f"Error deleting chunks for {url}: {e}")
 
-async def process_and_store_document(url: str, markdown: str):
-    """Process a document and store its chunks in parallel."""
-    # Split into chunks
-    chunks = chunk_text(markdown)
-    
-    # Process chunks in parallel
-    tasks = [
-        process_chunk(chunk, i, url) 
-        for i, chunk in enumerate(chunks)
-    ]
-    processed_chunks = await asyncio.gather(*tasks)
-    
-    # Store chunks in parallel
-    insert_tasks = [
-        insert_chunk(chunk) 
-        for chunk in processed_chunks
-    ]
-    await asyncio.gather(*insert_tasks)
-
-async def crawl_parallel(urls: List[str], max_concurrent: int = 5):
-    """Crawl multiple URLs in parallel with a concurrency limit."""
+async def delete_stale_chunks(url: str, chunk_numbers: Set[int], source: str):
+    """
+    Delete a page's stored chunks that are not among its current chunk numbers:
+    the tail of a page that now has fewer chunks, and duplicates skipped this time.
+    """
+    try:
+        query = supabase.table("site_pages").delete().eq("url", url).eq("metadata->>source", source)
+        if chunk_numbers:
+            query = query.not_.in_("chunk_number", sorted(chunk_numbers))
+        await asyncio.to_thread(query.execute)
+    except Exception as e:
+        print(f"Error deleting stale chunks for {url}: {e}")
+
+async def refresh_page_index():
+    """Rebuild the site_pages_index materialized view the agent lists pages from."""
+    try:
+        await asyncio.to_thread(supabase.rpc("refresh_site_pages_index").execute)
+    except Exception as e:
+        print(f"Error refreshing the page index: {e}")
+
+async def crawl_parallel(
+    urls: List[str],
+    max_concurrent: int = 5,
+    lastmods: Optional[Dict[str, Optional[str]]] = None,
+    incremental: bool = False,
+    url_sources: Optional[Dict[str, Source]] = None,
+    repair: bool = False
+):
+    """
+    Crawl multiple URLs and ingest them through a streaming pipeline.
+
+    Pages flow through bounded queues: crawl -> chunk -> summarize -> embed -> write.
+    Each stage has its own worker count, so the browser keeps rendering pages
+    (max_concurrent at a time) while earlier pages are still being summarized
+    and embedded.
+
+    With incremental=True, pages whose rendered markdown is identical to the
+    last ingested version are not re-processed, and changed pages have their
+    old chunks replaced.
+
+    Progress is journaled in checkpoint_journal: pages fetched by an earlier,
+    interrupted run are taken from the journal instead of the browser, and
+    their chunks that already reached site_pages are skipped.
+
+    Pages of several sources can go through the same run: each page is
+    chunked, embedded and stored with the settings of its entry in
+    `url_sources` (the Pydantic AI docs if it has none).
+
+    With repair=True the pages are fetched and every chunk is processed again,
+    whatever the journal says, see reingest_stale_duplicates().
+    """
+    lastmods = lastmods or {}
+    url_sources = url_sources or {}
     browser_config = BrowserConfig(
         headless=True,
         verbose=False,
@@ -190,56 +333,367 @@ async def crawl_parallel(urls: List[str], max_concurrent: int = 5):
     crawler = AsyncWebCrawler(config=browser_config)
     await crawler.start()
 
+    executor = ProcessPoolExecutor(max_workers=process_pool_workers) if process_pool_workers > 0 else None
+
+    # Pages with chunks still on their way to site_pages, by URL
+    pages_in_flight: Dict[str, PageJob] = {}
+    stale_chunk_deletes: Set[asyncio.Task] = set()
+
+    def finish_stored_page(page: PageJob):
+        record_page(page)
+        # Upserts only overwrite the chunk numbers the page still has, the rest are deleted
+        task = asyncio.ensure_future(delete_stale_chunks(page.url, page.chunk_numbers, page.source.name))
+        stale_chunk_deletes.add(task)
+        task.add_done_callback(stale_chunk_deletes.discard)
+
+    def record_page(page: PageJob, state: str = STORED):
+        # Remember the validators so the next incremental run can skip this page
+        crawl_state.record(
+            page.url,
+            page.markdown_hash,
+            lastmod=page.lastmod,
+            etag=page.headers.get("etag"),
+            last_modified=page.headers.get("last-modified"),
+            source=page.source.name
+        )
+        checkpoint_journal.finish_page(page.url, state)
+
+    def mark_chunks_stored(rows: List[Dict[str, Any]]):
+        # Called by the writer once rows are actually in Supabase
+        checkpoint_journal.record_many([(row["url"], row["chunk_number"]) for row in rows], STORED)
+        for row in rows:
+            page = pages_in_flight.get(row["url"])
+            if page is None:
+                continue
+            page.remaining_chunks -= 1
+            if page.remaining_chunks == 0:
+                del pages_in_flight[page.url]
+                finish_stored_page(page)
+
+    site_pages_writer.on_written = mark_chunks_stored
+
+    async def crawl_stage(url: str) -> List[PageJob]:
+        source = url_sources.get(url) or DEFAULT_SOURCES[0]
+        # Pages fetched before an interrupted run don't need the browser again
+        fetched = None if repair else checkpoint_journal.fetched_page(url)
+        if fetched:
+            print(f"Resuming from checkpoint: {url}")
+            return [PageJob(url, fetched.markdown, fetched.markdown_hash, fetched.headers, source, lastmods.get(url))]
+
+        result = await crawler.arun(
+            url=url,
+            config=crawl_config,
+            session_id="session1"
+        )
+        if not result.success:
+            print(f"Failed: {url} - Error: {result.error_message}")
+            checkpoint_journal.record(url, FAILED, detail={"error": result.error_message})
+            return []
+
+        print(f"Successfully crawled: {url}")
+        markdown = result.markdown_v2.raw_markdown
+        page = PageJob(url, markdown, content_hash(markdown), result.response_headers or {}, source, lastmods.get(url))
+        previous = crawl_state.get(url)
+        if incremental and previous and previous.content_hash == page.markdown_hash:
+            print(f"Unchanged, skipping: {url}")
+            record_page(page, SKIPPED)
+            return []
+        # The page is chunked again from scratch, so none of its old chunks is a
+        # canonical copy anymore, whether the crawl is incremental or not
+        dedup_index = get_dedup_index(source.name)
+        if dedup_index:
+            dedup_index.remove_url(url)
+        checkpoint_journal.record_fetched(url, markdown, page.markdown_hash, page.headers)
+        return [page]
+
+    async def chunk_stage(page: PageJob) -> List[ChunkJob]:
+        max_tokens = page.source.chunk_max_tokens or chunk_max_tokens
+        overlap_tokens = chunk_overlap_tokens if page.source.chunk_overlap_tokens is None else page.source.chunk_overlap_tokens
+        # Cleanup, chunking and hashing are CPU-bound, so they can run in worker processes
+        if executor:
+            document = await asyncio.get_running_loop().run_in_executor(
+                executor, process_document, page.markdown, max_tokens, overlap_tokens
+            )
+        else:
+            document = process_document(page.markdown, max_tokens, overlap_tokens)
+        checkpoint_journal.record(page.url, CHUNKED, detail={"chunks": len(document.chunks)})
+
+        # On resume, chunks that already reached site_pages are not processed again
+        stored = set() if repair else checkpoint_journal.stored_chunks(page.url)
+        dedup_index = get_dedup_index(page.source.name)
+        jobs = []
+        for i, (start, end, _) in enumerate(document.chunks):
+            if i in stored:
+                page.chunk_numbers.add(i)
+                continue
+            job = ChunkJob(page, i, document.markdown[start:end], start, end, document.chunk_hashes[i])
+            if dedup_index:
+                job.duplicate_of = dedup_index.check(job.content_hash, document.chunk_fingerprints[i], page.url, i)
+                if job.duplicate_of and dedup_mode == "skip":
+                    continue
+            page.chunk_numbers.add(i)
+            jobs.append(job)
+        page.remaining_chunks = len(jobs)
+        if jobs:
+            pages_in_flight[page.url] = page
+        else:
+            finish_stored_page(page)
+        return jobs
+
+    async def summarize_stage(job: ChunkJob) -> List[ChunkJob]:
+        if job.duplicate_of:
+            return [job]
+        job.extracted = await summarize_chunk(job.content, job.page.url, job.content_hash)
+        checkpoint_journal.record(job.page.url, SUMMARIZED, job.chunk_number)
+        return [job]
+
+    async def embed_stage(job: ChunkJob) -> List[ChunkJob]:
+        if job.duplicate_of:
+            return [job]
+        job.embedding = await embed_chunk(job.content, job.content_hash, job.page.source.embedding_model)
+        checkpoint_journal.record(job.page.url, EMBEDDED, job.chunk_number)
+        return [job]
+
+    async def write_stage(job: ChunkJob) -> List[ChunkJob]:
+        if job.duplicate_of:
+            processed = build_duplicate_chunk(
+                job.content, job.chunk_number, job.page.url, job.duplicate_of,
+                span=(job.start, job.end), source=job.page.source.name
+            )
+        else:
+            processed = build_processed_chunk(
+                job.content, job.chunk_number, job.page.url, job.extracted, job.embedding,
+                span=(job.start, job.end), source=job.page.source.name
+            )
+        await insert_chunk(processed)
+        return []
+
+    pipeline = IngestPipeline([
+        Stage("crawl", crawl_stage, workers=max_concurrent, queue_size=pipeline_queue_size),
+        Stage("chunk", chunk_stage, workers=max(process_pool_workers, 1), queue_size=max_concurrent),
+        Stage("summarize", summarize_stage, workers=summarize_workers, queue_size=pipeline_queue_size),
+        Stage("embed", embed_stage, workers=embed_workers, queue_size=pipeline_queue_size),
+        Stage("write", write_stage, workers=write_workers, queue_size=pipeline_queue_size),
+    ])
+
     try:
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def process_url(url: str):
-            async with semaphore:
-                result = await crawler.arun(
-                    url=url,
-                    config=crawl_config,
-                    session_id="session1"
-                )
-                if result.success:
-                    print(f"Successfully crawled: {url}")
-                    await process_and_store_document(url, result.markdown_v2.raw_markdown)
-                else:
-                    print(f"Failed: {url} - Error: {result.error_message}")
-        
-        # Process all URLs in parallel with limited concurrency
-        await asyncio.gather(*[process_url(url) for url in urls])
+        await pipeline.run(urls)
+        # Flush the writer (and wait for background flushes) so the last pages get recorded as stored
+        await site_pages_writer.close()
+        await asyncio.gather(*stale_chunk_deletes)
     finally:
         await crawler.close()
+        if executor:
+            executor.shutdown()
+        print(pipeline.summary())
 
-def get_pydantic_ai_docs_urls() -> List[str]:
-    """Get URLs from Pydantic AI docs sitemap."""
-    sitemap_url = "https://ai.pydantic.dev/sitemap.xml"
+def get_sitemap(source: Source) -> Dict[str, Optional[str]]:
+    """Get URLs and their lastmod dates (if any) from a source's sitemap."""
     try:
-        response = requests.get(sitemap_url)
+        response = requests.get(source.sitemap_url)
         response.raise_for_status()
         
         # Parse the XML
         root = ElementTree.fromstring(response.content)
         
-        # Extract all URLs from the sitemap
+        # Extract all URLs and their lastmod from the sitemap
         namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-        urls = [loc.text for loc in root.findall('.//ns:loc', namespace)]
+        pages = {}
+        for entry in root.findall('.//ns:url', namespace):
+            loc = entry.find('ns:loc', namespace)
+            lastmod = entry.find('ns:lastmod', namespace)
+            if loc is not None and loc.text and loc.text.strip().startswith(source.url_prefix):
+                pages[loc.text.strip()] = lastmod.text.strip() if lastmod is not None and lastmod.text else None
         
-        return urls
+        return pages
     except Exception as e:
-        print(f"Error fetching sitemap: {e}")
-        return []
+        print(f"Error fetching sitemap {source.sitemap_url}: {e}")
+        return {}
+
+def get_pydantic_ai_docs_sitemap() -> Dict[str, Optional[str]]:
+    """Get URLs and their lastmod dates (if any) from Pydantic AI docs sitemap."""
+    return get_sitemap(DEFAULT_SOURCES[0])
+
+def get_pydantic_ai_docs_urls() -> List[str]:
+    """Get URLs from Pydantic AI docs sitemap."""
+    return list(get_pydantic_ai_docs_sitemap())
+
+async def has_page_changed(
+    client: httpx.AsyncClient,
+    url: str,
+    lastmod: Optional[str],
+    previous: Optional[PageState]
+) -> bool:
+    """Check whether a page may have changed since it was last ingested, without rendering it."""
+    if previous is None:
+        return True
+
+    # The sitemap lastmod is the cheapest signal when the site provides it
+    if lastmod and previous.lastmod:
+        return lastmod != previous.lastmod
+
+    # Otherwise ask the server with a conditional request
+    headers = {}
+    if previous.etag:
+        headers["If-None-Match"] = previous.etag
+    if previous.last_modified:
+        headers["If-Modified-Since"] = previous.last_modified
+    if not headers:
+        return True  # Nothing to compare, the content hash check after crawling decides
+
+    try:
+        response = await client.head(url, headers=headers, follow_redirects=True)
+        return response.status_code != 304
+    except Exception as e:
+        print(f"Error checking {url} for changes: {e}")
+        return True
+
+async def select_changed_urls(sitemap: Dict[str, Optional[str]], source: Optional[str] = None) -> List[str]:
+    """Return the sitemap URLs that are new or may have changed since the last crawl."""
+    previous = crawl_state.all(source)
+    async with httpx.AsyncClient(timeout=10) as client:
+        changed = await asyncio.gather(*[
+            has_page_changed(client, url, lastmod, previous.get(url))
+            for url, lastmod in sitemap.items()
+        ])
+    return [url for url, is_changed in zip(sitemap, changed) if is_changed]
+
+async def remove_deleted_pages(sitemap: Dict[str, Optional[str]], source: str = DEFAULT_SOURCE) -> List[str]:
+    """Delete stored chunks for a source's previously crawled URLs that are no longer in its sitemap."""
+    gone = [url for url in crawl_state.all(source) if url not in sitemap]
+    dedup_index = get_dedup_index(source)
+    for url in gone:
+        await delete_page_chunks(url, source)
+        if dedup_index:
+            dedup_index.remove_url(url)
+    crawl_state.remove(gone)
+    return gone
+
+async def reingest_stale_duplicates(max_rounds: int = 3):
+    """
+    Ingest again the pages with duplicate chunks whose canonical copy changed
+    or was removed, so their content is embedded again or points at its new
+    canonical copy. Re-ingesting a page can leave other references stale, hence
+    the rounds; anything left is picked up by the next run.
+    """
+    for _ in range(max_rounds):
+        url_sources = {
+            url: sources[name]
+            for name, dedup_index in dedup_indexes.items() if name in sources
+            for url in dedup_index.stale_references()
+        }
+        if not url_sources:
+            return
+        print(f"Re-ingesting {len(url_sources)} pages whose duplicate chunks lost their canonical copy")
+        lastmods = {url: state.lastmod if (state := crawl_state.get(url)) else None for url in url_sources}
+        await crawl_parallel(list(url_sources), lastmods=lastmods, url_sources=url_sources, repair=True)
 
 async def main():
-    # Get URLs from Pydantic AI docs
-    urls = get_pydantic_ai_docs_urls()
-    if not urls:
-        print("No URLs found to crawl")
-        return
-    
-    print(f"Found {len(urls)} URLs to crawl")
-    await crawl_parallel(urls)
+    parser = argparse.ArgumentParser(description="Crawl the documentation sites in sources.json into Supabase.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-process pages that changed since the last crawl and remove pages that are gone"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last run from where it stopped, including half-processed pages"
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        choices=list(sources),
+        help="Only crawl this source (can be repeated); all sources by default"
+    )
+    args = parser.parse_args()
+
+    if args.resume:
+        # Pick up the URLs the last run didn't finish, with the same options
+        sitemap = checkpoint_journal.pending_urls()
+        incremental = checkpoint_journal.run_options().get("incremental", False)
+        # Runs journaled before sources existed only crawled the Pydantic AI docs
+        names = {url: name or DEFAULT_SOURCE for url, name in checkpoint_journal.url_sources().items() if url in sitemap}
+        url_sources = {url: sources[name] for url, name in names.items() if name in sources}
+        if len(url_sources) < len(sitemap):
+            print(f"Skipping {len(sitemap) - len(url_sources)} URLs of sources no longer in the registry")
+        urls = list(url_sources)
+        if not urls:
+            print("Nothing to resume")
+            return
+        print(f"Resuming last run: {len(urls)} URLs left")
+    else:
+        selected = [sources[name] for name in args.source] if args.source else list(sources.values())
+        sitemaps = await asyncio.gather(*[asyncio.to_thread(get_sitemap, source) for source in selected])
+        incremental = args.incremental
+        sitemap: Dict[str, Optional[str]] = {}
+        url_sources: Dict[str, Source] = {}
+        source_urls: List[List[str]] = []
+        removed_any = False
+        for source, source_sitemap in zip(selected, sitemaps):
+            # An empty sitemap is more likely a fetch error than a deleted site, so nothing is removed
+            if not source_sitemap:
+                print(f"{source.name}: no URLs found in {source.sitemap_url}")
+                continue
+
+            print(f"{source.name}: found {len(source_sitemap)} URLs in the sitemap")
+            urls = list(source_sitemap)
+            if incremental:
+                removed = await remove_deleted_pages(source_sitemap, source.name)
+                urls = await select_changed_urls(source_sitemap, source.name)
+                removed_any = removed_any or bool(removed)
+                print(
+                    f"{source.name}: incremental crawl: {len(urls)} new or changed, "
+                    f"{len(source_sitemap) - len(urls)} unchanged, {len(removed)} removed"
+                )
+
+            # A URL is stored under one source only, the first that lists it
+            shared = [url for url in urls if url in url_sources]
+            if shared:
+                print(f"{source.name}: skipping {len(shared)} URLs already crawled for another source")
+            urls = [url for url in urls if url not in url_sources]
+            sitemap.update({url: source_sitemap[url] for url in urls})
+            url_sources.update({url: source for url in urls})
+            source_urls.append(urls)
+
+        # Interleave the sources so they are all crawled at once rather than one after another
+        urls = [url for group in zip_longest(*source_urls) for url in group if url is not None]
+        # Removed pages may have been the canonical copy of other pages' duplicates
+        dedup_indexes_used = [get_dedup_index(source.name) for source in selected]
+        stale = any(dedup_index.stale_references() for dedup_index in dedup_indexes_used if dedup_index)
+        if removed_any and not urls and not stale:
+            await refresh_page_index()
+        if not urls and not stale:
+            print("Nothing to crawl")
+            return
+
+        print(f"Found {len(urls)} URLs to crawl")
+        checkpoint_journal.start_run(
+            {url: sitemap[url] for url in urls},
+            {"incremental": incremental},
+            {url: url_sources[url].name for url in urls}
+        )
+
+    try:
+        if urls:
+            await crawl_parallel(urls, lastmods=sitemap, incremental=incremental, url_sources=url_sources)
+        await reingest_stale_duplicates()
+    finally:
+        for batcher in embedding_batchers.values():
+            await batcher.close()
+        await site_pages_writer.close()
+        await refresh_page_index()
+        for model, batcher in embedding_batchers.items():
+            print(f"{model}: {batcher.stats.summary()}")
+        print(openai_limiter.summary())
+        print(site_pages_writer.summary())
+        print(f"Ingest cache: {ingest_cache.hits} hits, {ingest_cache.misses} misses")
+        ingest_cache.close()
+        crawl_state.close()
+        checkpoint_journal.close()
+        for source, dedup_index in dedup_indexes.items():
+            print(f"{source}: {dedup_index.summary()}")
+            dedup_index.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
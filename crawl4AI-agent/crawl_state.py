@@ -0,0 +1,85 @@
+import time
+import sqlite3
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+
+@dataclass
+class PageState:
+    url: str
+    lastmod: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+    crawled_at: float
+
+class CrawlState:
+    """
+    Local SQLite record of what each URL looked like the last time it was ingested.
+
+    Used by incremental crawls to skip pages whose sitemap lastmod, HTTP
+    validators (ETag / Last-Modified) or rendered content hash have not changed.
+    """
+
+    def __init__(self, path: str, default_source: Optional[str] = None):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("""
+            create table if not exists crawl_state (
+                url text primary key,
+                lastmod text,
+                etag text,
+                last_modified text,
+                content_hash text,
+                crawled_at real not null,
+                source text
+            )
+        """)
+        # State files from before sources were tracked: their URLs belong to default_source
+        columns = [row[1] for row in self._conn.execute("pragma table_info(crawl_state)")]
+        if "source" not in columns:
+            self._conn.execute("alter table crawl_state add column source text")
+            self._conn.execute("update crawl_state set source = ?", (default_source,))
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[PageState]:
+        row = self._conn.execute(
+            "select url, lastmod, etag, last_modified, content_hash, crawled_at from crawl_state where url = ?",
+            (url,)
+        ).fetchone()
+        return PageState(*row) if row else None
+
+    def all(self, source: Optional[str] = None) -> Dict[str, PageState]:
+        """State of every recorded URL, or only of the URLs of one source."""
+        query = "select url, lastmod, etag, last_modified, content_hash, crawled_at from crawl_state"
+        rows = self._conn.execute(
+            query + " where source = ?" if source else query,
+            (source,) if source else ()
+        ).fetchall()
+        return {row[0]: PageState(*row) for row in rows}
+
+    def record(
+        self,
+        url: str,
+        content_hash: str,
+        lastmod: Optional[str] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        source: Optional[str] = None
+    ):
+        """Record that a URL was successfully ingested with the given validators."""
+        self._conn.execute(
+            """
+            insert or replace into crawl_state (url, lastmod, etag, last_modified, content_hash, crawled_at, source)
+            values (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (url, lastmod, etag, last_modified, content_hash, time.time(), source)
+        )
+        self._conn.commit()
+
+    def remove(self, urls: List[str]):
+        self._conn.executemany("delete from crawl_state where url = ?", [(url,) for url in urls])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,190 @@
+import re
+import sqlite3
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+
+WORD = re.compile(r"\w+")
+
+# A 64-bit fingerprint split into 4 bands of 16 bits: two fingerprints within
+# 3 bits of each other are guaranteed to share at least one band exactly
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash of a text's word shingles; similar texts get fingerprints a few bits apart."""
+    words = WORD.findall(text.lower())
+    shingles = [
+        " ".join(words[i:i + shingle_size])
+        for i in range(max(len(words) - shingle_size + 1, 1))
+    ]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+@dataclass
+class Canonical:
+    """The first stored copy of a chunk, which duplicates point to."""
+    url: str
+    chunk_number: int
+    content_hash: str
+    exact: bool
+
+class DedupIndex:
+    """
+    Exact and near-duplicate chunk index for the whole crawl.
+
+    Chunks are indexed by content hash (exact duplicates) and by SimHash
+    fingerprint (near duplicates within `max_distance` bits). The index lives in
+    memory while crawling and is persisted to SQLite so later runs still
+    recognize chunks stored by earlier ones.
+
+    A chunk is never a duplicate of another chunk of the same page, since a
+    page's chunks are all rewritten together. The index also remembers which
+    canonical copy each duplicate points to, so pages whose canonical copy
+    changed or disappeared can be found with stale_references() and ingested again.
+    """
+
+    def __init__(self, path: str, max_distance: int = 3):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for the banded lookup")
+        self.path = path
+        self.max_distance = max_distance
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._by_hash: Dict[str, Tuple[str, int, int]] = {}
+        self._bands: List[Dict[int, List[str]]] = [{} for _ in range(BANDS)]
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            create table if not exists chunk_fingerprints (
+                content_hash text primary key,
+                fingerprint integer not null,
+                url text not null,
+                chunk_number integer not null
+            )
+        """)
+        self._conn.execute("create index if not exists idx_chunk_fingerprints_url on chunk_fingerprints (url)")
+        self._conn.execute("""
+            create table if not exists duplicate_chunks (
+                url text not null,
+                chunk_number integer not null,
+                canonical_hash text not null,
+                canonical_url text not null,
+                canonical_chunk_number integer not null,
+                primary key (url, chunk_number)
+            )
+        """)
+        self._conn.commit()
+        for content_hash, fingerprint, url, chunk_number in self._conn.execute(
+            "select content_hash, fingerprint, url, chunk_number from chunk_fingerprints"
+        ):
+            self._index(content_hash, _to_unsigned(fingerprint), url, chunk_number)
+
+    def _index(self, content_hash: str, fingerprint: int, url: str, chunk_number: int):
+        self._by_hash[content_hash] = (url, chunk_number, fingerprint)
+        for band in range(BANDS):
+            key = (fingerprint >> (band * BAND_BITS)) & BAND_MASK
+            self._bands[band].setdefault(key, []).append(content_hash)
+
+    def find(self, content_hash: str, fingerprint: int, url: str, chunk_number: int) -> Optional[Canonical]:
+        """Return the canonical copy of this chunk if it duplicates another stored chunk."""
+        existing = self._by_hash.get(content_hash)
+        if existing:
+            if existing[0] == url:
+                return None  # This chunk is the canonical copy, or repeats one of its own page
+            return Canonical(existing[0], existing[1], content_hash, exact=True)
+
+        for band in range(BANDS):
+            key = (fingerprint >> (band * BAND_BITS)) & BAND_MASK
+            for candidate_hash in self._bands[band].get(key, ()):
+                candidate = self._by_hash.get(candidate_hash)
+                if candidate is None or candidate[0] == url:
+                    continue
+                if bin(candidate[2] ^ fingerprint).count("1") <= self.max_distance:
+                    return Canonical(candidate[0], candidate[1], candidate_hash, exact=False)
+        return None
+
+    def check(self, content_hash: str, fingerprint: int, url: str, chunk_number: int) -> Optional[Canonical]:
+        """Look a chunk up and, if it is not a duplicate, add it as a canonical copy."""
+        canonical = self.find(content_hash, fingerprint, url, chunk_number)
+        if canonical is None:
+            self.add(content_hash, fingerprint, url, chunk_number)
+            return None
+
+        if canonical.exact:
+            self.exact_duplicates += 1
+        else:
+            self.near_duplicates += 1
+        self._conn.execute(
+            "insert or replace into duplicate_chunks (url, chunk_number, canonical_hash, canonical_url, canonical_chunk_number) "
+            "values (?, ?, ?, ?, ?)",
+            (url, chunk_number, canonical.content_hash, canonical.url, canonical.chunk_number)
+        )
+        self._conn.commit()
+        return canonical
+
+    def add(self, content_hash: str, fingerprint: int, url: str, chunk_number: int):
+        if content_hash in self._by_hash:
+            return
+        self._index(content_hash, fingerprint, url, chunk_number)
+        self._conn.execute(
+            "insert or replace into chunk_fingerprints (content_hash, fingerprint, url, chunk_number) values (?, ?, ?, ?)",
+            (content_hash, _to_signed(fingerprint), url, chunk_number)
+        )
+        self._conn.commit()
+
+    def remove_url(self, url: str):
+        """
+        Forget the chunks of a page that is about to be chunked again or disappeared.
+
+        Duplicates on other pages that pointed at its chunks show up in
+        stale_references() unless the same chunks are added back.
+        """
+        hashes = [h for h, (entry_url, _, _) in self._by_hash.items() if entry_url == url]
+        for content_hash in hashes:
+            _, _, fingerprint = self._by_hash.pop(content_hash)
+            for band in range(BANDS):
+                key = (fingerprint >> (band * BAND_BITS)) & BAND_MASK
+                bucket = self._bands[band].get(key, [])
+                if content_hash in bucket:
+                    bucket.remove(content_hash)
+        self._conn.execute("delete from chunk_fingerprints where url = ?", (url,))
+        self._conn.execute("delete from duplicate_chunks where url = ?", (url,))
+        self._conn.commit()
+
+    def stale_references(self) -> List[str]:
+        """Pages with duplicate chunks whose canonical copy is no longer stored where they point."""
+        stale = set()
+        for url, canonical_hash, canonical_url, canonical_chunk_number in self._conn.execute(
+            "select url, canonical_hash, canonical_url, canonical_chunk_number from duplicate_chunks"
+        ):
+            canonical = self._by_hash.get(canonical_hash)
+            if canonical is None or canonical[:2] != (canonical_url, canonical_chunk_number):
+                stale.add(url)
+        return sorted(stale)
+
+    def summary(self) -> str:
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return (
+            f"Dedup index: {self.exact_duplicates} exact and {self.near_duplicates} near duplicates, "
+            f"{duplicates * 2} LLM/embedding calls saved, {len(self._by_hash)} canonical chunks"
+        )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,48 @@
+import re
+from typing import List, Tuple
+from dataclasses import dataclass
+
+from chunker import chunk_markdown
+from ingest_cache import content_hash
+from dedup_index import simhash
+
+# Runs of three or more newlines (with optional trailing spaces) collapse to one blank line
+EXTRA_BLANK_LINES = re.compile(r"\n(?:[ \t]*\n){2,}")
+TRAILING_WHITESPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+@dataclass
+class ProcessedDocument:
+    """
+    Result of the CPU-bound work on one page.
+
+    Kept compact so it is cheap to send back from a worker process: chunks are
+    (start, end, token_count) offsets into `markdown` rather than copies of
+    their text.
+    """
+    markdown: str
+    chunks: List[Tuple[int, int, int]]
+    chunk_hashes: List[str]
+    chunk_fingerprints: List[int]
+
+def clean_markdown(markdown: str) -> str:
+    """Normalize line endings and strip whitespace noise left over from HTML conversion."""
+    markdown = markdown.replace("\r\n", "\n").replace("\r", "\n")
+    markdown = TRAILING_WHITESPACE.sub("", markdown)
+    markdown = EXTRA_BLANK_LINES.sub("\n\n", markdown)
+    return markdown.strip()
+
+def process_document(markdown: str, max_tokens: int, overlap_tokens: int) -> ProcessedDocument:
+    """
+    Clean, chunk, hash and fingerprint a page's markdown.
+
+    This is a plain top-level function so it can run in a ProcessPoolExecutor.
+    """
+    markdown = clean_markdown(markdown)
+    chunks = chunk_markdown(markdown, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    texts = [chunk.text(markdown) for chunk in chunks]
+    return ProcessedDocument(
+        markdown=markdown,
+        chunks=[(chunk.start, chunk.end, chunk.token_count) for chunk in chunks],
+        chunk_hashes=[content_hash(text) for text in texts],
+        chunk_fingerprints=[simhash(text) for text in texts]
+    )
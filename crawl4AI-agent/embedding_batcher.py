@@ -0,0 +1,126 @@
+import time
+import asyncio
+from typing import List, Optional, Tuple
+from dataclasses import dataclass, field
+
+from openai import AsyncOpenAI
+
+from rate_limiter import AdaptiveLimiter
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    inputs: int = 0
+    prompt_tokens: int = 0
+    errors: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """Return a one-line summary of the batches sent so far."""
+        if not self.batches:
+            return "Embedding batches: none sent"
+        avg_latency = sum(self.latencies) / len(self.latencies)
+        return (
+            f"Embedding batches: {self.batches} requests, {self.inputs} inputs "
+            f"({self.inputs / self.batches:.1f} per request), {self.prompt_tokens} tokens, "
+            f"avg latency {avg_latency * 1000:.0f}ms, max latency {max(self.latencies) * 1000:.0f}ms, "
+            f"{self.errors} errors"
+        )
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from every in-flight document and sends them
+    to OpenAI as multi-input requests.
+
+    A batch is sent as soon as it holds `batch_size` inputs or `flush_interval`
+    seconds after its first input arrived, whichever comes first. At most
+    `max_concurrent_requests` batches are in flight at any time. With a
+    `limiter`, requests also go through its adaptive concurrency and retries;
+    if a batch still fails, every embed() call waiting on it raises.
+    """
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str = "text-embedding-3-small",
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        max_concurrent_requests: int = 4,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        self.openai_client = openai_client
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.limiter = limiter
+        self.stats = BatchStats()
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+        self._in_flight = set()
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text for embedding and wait for its vector."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_interval, self._flush)
+
+        return await future
+
+    async def close(self):
+        """Send whatever is still pending and wait for all batches to finish."""
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        task = asyncio.ensure_future(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+        # Anything left over (more than one batch queued at once) goes out right away
+        if self._pending:
+            self._flush()
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                inputs = [text for text, _ in batch]
+                if self.limiter:
+                    response = await self.limiter.call(
+                        lambda: self.openai_client.embeddings.with_raw_response.create(model=self.model, input=inputs)
+                    )
+                else:
+                    response = await self.openai_client.embeddings.create(model=self.model, input=inputs)
+            except Exception as e:
+                print(f"Error getting embeddings for batch of {len(batch)}: {e}")
+                self.stats.errors += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.stats.latencies.append(time.perf_counter() - start)
+            self.stats.batches += 1
+            self.stats.inputs += len(batch)
+            if response.usage:
+                self.stats.prompt_tokens += response.usage.prompt_tokens
+
+            # The API returns one embedding per input, tagged with the input's index
+            for item in response.data:
+                _, future = batch[item.index]
+                if not future.done():
+                    future.set_result(item.embedding)
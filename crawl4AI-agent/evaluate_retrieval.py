@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+import argparse
+from hashlib import blake2b
+from typing import Any, Awaitable, Callable, Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from supabase import Client
+
+from hybrid_search import tokenize
+from vector_index import LocalVectorIndex
+from site_pages_store import SitePagesStore
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_fixtures.json")
+FILTER = {"source": "pydantic_ai_docs"}
+
+def hashing_embedding(text: str, dimensions: int = 1536) -> List[float]:
+    """
+    Deterministic stand-in for an embedding model: hashed character trigrams of each word.
+
+    It needs no API key, so the harness runs anywhere, but it is much weaker
+    than a real embedding model; use --embeddings openai for representative numbers.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in tokenize(text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            digest = blake2b(padded[i:i + 3].encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "big") % dimensions] += 1
+    return vector.tolist()
+
+def recall_at_k(results: List[Dict[str, Any]], relevant_urls: List[str], k: int) -> float:
+    """Fraction of the relevant pages that have a chunk in the top k results."""
+    found = {row["url"] for row in results[:k]}
+    return sum(url in found for url in relevant_urls) / len(relevant_urls)
+
+async def evaluate(
+    name: str,
+    search: Callable[[str, List[float], int], Awaitable[List[Dict[str, Any]]]],
+    queries: List[Dict[str, Any]],
+    embeddings: List[List[float]],
+    ks: List[int]
+) -> Dict[str, Any]:
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        results = await search(query["query"], embedding, max(ks))
+        latencies.append(time.perf_counter() - start)
+        for k in ks:
+            recalls[k].append(recall_at_k(results, query["relevant_urls"], k))
+
+    report = {"mode": name, **{f"recall@{k}": float(np.mean(recalls[k])) for k in ks}}
+    report["p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+    report["p95_ms"] = float(np.percentile(latencies, 95) * 1000)
+    return report
+
+async def main():
+    parser = argparse.ArgumentParser(description="Report recall@k and latency for vector, lexical and hybrid retrieval.")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="JSON file with a corpus and queries with relevant URLs")
+    parser.add_argument("--embeddings", choices=["hashing", "openai"], default="hashing")
+    parser.add_argument("--live", action="store_true", help="Query match_site_pages(_hybrid) in the Supabase project from .env instead of the fixture corpus")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    with open(args.fixtures, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    queries = fixtures["queries"]
+
+    load_dotenv()
+    if args.embeddings == "openai" or args.live:
+        openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+        async def embed(texts: List[str]) -> List[List[float]]:
+            vectors = []
+            for i in range(0, len(texts), 100):
+                response = await openai_client.embeddings.create(model="text-embedding-3-small", input=texts[i:i + 100])
+                vectors.extend(item.embedding for item in response.data)
+            return vectors
+    else:
+        async def embed(texts: List[str]) -> List[List[float]]:
+            return [hashing_embedding(text) for text in texts]
+
+    query_embeddings = await embed([query["query"] for query in queries])
+
+    if args.live:
+        store = SitePagesStore(Client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")))
+        modes = {
+            "vector": lambda text, embedding, k: store.match(embedding, k, FILTER),
+            "hybrid": lambda text, embedding, k: store.match_hybrid(text, embedding, k, FILTER),
+        }
+    else:
+        corpus = fixtures["corpus"]
+        index = LocalVectorIndex(os.path.join(tempfile.mkdtemp(), "index"))
+        index.replace(corpus, await embed([f"{row['title']}\n{row['content']}" for row in corpus]))
+
+        async def vector(text, embedding, k):
+            return index.search(embedding, k, FILTER)
+
+        async def lexical(text, embedding, k):
+            return index.lexical_search(text, k, FILTER)
+
+        async def hybrid(text, embedding, k):
+            return index.hybrid_search(text, embedding, k, FILTER)
+
+        modes = {"vector": vector, "lexical": lexical, "hybrid": hybrid}
+
+    source = "Supabase" if args.live else f"{len(fixtures['corpus'])} fixture chunks"
+    print(f"{len(queries)} queries against {source}, {args.embeddings if not args.live else 'openai'} embeddings")
+    header = f"{'mode':<10}" + "".join(f"{f'recall@{k}':>11}" for k in args.k) + f"{'p50 ms':>10}{'p95 ms':>10}"
+    print(header)
+    for name, search in modes.items():
+        report = await evaluate(name, search, queries, query_embeddings, args.k)
+        print(
+            f"{name:<10}" + "".join(f"{report[f'recall@{k}']:>11.3f}" for k in args.k)
+            + f"{report['p50_ms']:>10.2f}{report['p95_ms']:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
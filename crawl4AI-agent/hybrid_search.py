@@ -0,0 +1,91 @@
+import re
+import math
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WORD = re.compile(r"[A-Za-z0-9_]+")
+CAMEL_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are kept whole and also split into their parts, so a query for
+    `RunContext` matches the identifier exactly while "run context" still
+    matches its parts: "RunContext" -> runcontext, run, context.
+    """
+    terms = []
+    for word in WORD.findall(text):
+        terms.append(word.lower())
+        parts = [part.lower() for piece in word.split("_") for part in CAMEL_PART.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index, the local stand-in for the site_pages full-text search.
+
+    Postings are kept as NumPy arrays per term, so scoring a query is one
+    vectorized update per query term.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths[doc_id] = sum(counts.values())
+            for term, count in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                tfs.append(count)
+
+        average = float(lengths.mean()) if self.size else 0.0
+        self._norms = self.k1 * (1 - self.b + self.b * lengths / (average or 1))
+        self._postings = {
+            term: (np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        """Return the BM25 score of every document for the query."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norms[ids])
+        return scores
+
+    def search(self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to `top_k` (document id, score) pairs with a positive score, best first."""
+        scores = self.scores(query)
+        if mask is not None:
+            scores = np.where(mask, scores, 0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in candidates]
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several best-first rankings into one with reciprocal rank fusion.
+
+    Each item scores sum(1 / (k + rank)) over the rankings it appears in, with
+    ranks starting at 1, so items found by several retrievers rise to the top
+    without having to compare their raw scores.
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
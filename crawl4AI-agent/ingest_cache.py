@@ -0,0 +1,97 @@
+import json
+import time
+import sqlite3
+import hashlib
+from typing import List, Dict, Optional
+
+def content_hash(text: str) -> str:
+    """Return a stable hash of a chunk's content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class IngestCache:
+    """
+    Persistent SQLite cache of chunk titles/summaries and embeddings.
+
+    Entries are keyed by the hash of the chunk content plus the model that
+    produced them, so an unchanged chunk never hits the LLM or embedding API
+    twice for the same model. Once the cache holds more than `max_entries`
+    rows, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("""
+            create table if not exists chunk_cache (
+                key text primary key,
+                value text not null,
+                last_used real not null
+            )
+        """)
+        self._conn.execute("create index if not exists idx_chunk_cache_last_used on chunk_cache (last_used)")
+        self._conn.commit()
+
+    def _key(self, kind: str, text: str, model: str, digest: Optional[str]) -> str:
+        return f"{kind}:{model}:{digest or content_hash(text)}"
+
+    def _get(self, kind: str, text: str, model: str, digest: Optional[str] = None) -> Optional[str]:
+        key = self._key(kind, text, model, digest)
+        row = self._conn.execute("select value from chunk_cache where key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("update chunk_cache set last_used = ? where key = ?", (time.time(), key))
+        self._conn.commit()
+        return row[0]
+
+    def _set(self, kind: str, text: str, model: str, value: str, digest: Optional[str] = None):
+        key = self._key(kind, text, model, digest)
+        self._conn.execute(
+            "insert or replace into chunk_cache (key, value, last_used) values (?, ?, ?)",
+            (key, value, time.time())
+        )
+        self._conn.commit()
+
+        # Only check the size every so often, counting rows is not free
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= 1000:
+            self.evict()
+
+    def get_summary(self, text: str, model: str, digest: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """Return the cached title/summary for a chunk, or None. `digest` skips re-hashing the text."""
+        value = self._get("summary", text, model, digest)
+        return json.loads(value) if value is not None else None
+
+    def set_summary(self, text: str, model: str, extracted: Dict[str, str], digest: Optional[str] = None):
+        self._set("summary", text, model, json.dumps(extracted), digest)
+
+    def get_embedding(self, text: str, model: str, digest: Optional[str] = None) -> Optional[List[float]]:
+        """Return the cached embedding for a chunk, or None. `digest` skips re-hashing the text."""
+        value = self._get("embedding", text, model, digest)
+        return json.loads(value) if value is not None else None
+
+    def set_embedding(self, text: str, model: str, embedding: List[float], digest: Optional[str] = None):
+        self._set("embedding", text, model, json.dumps(embedding), digest)
+
+    def evict(self):
+        """Drop the least recently used entries beyond `max_entries`."""
+        self._writes_since_evict = 0
+        count = self._conn.execute("select count(*) from chunk_cache").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self._conn.execute("""
+            delete from chunk_cache where key in (
+                select key from chunk_cache order by last_used asc limit ?
+            )
+        """, (count - self.max_entries,))
+        self._conn.commit()
+
+    def close(self):
+        self.evict()
+        self._conn.close()
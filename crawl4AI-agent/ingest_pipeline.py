@@ -0,0 +1,119 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from dataclasses import dataclass, field
+
+@dataclass
+class Stage:
+    """
+    One step of the ingestion pipeline.
+
+    `handler` takes an item from this stage's queue and returns the items to
+    pass on to the next stage (zero or more). Each stage runs `workers`
+    concurrent handlers and holds at most `queue_size` waiting items, so a slow
+    stage pushes back on the ones before it instead of buffering everything.
+    """
+    name: str
+    handler: Callable[[Any], Awaitable[Optional[Iterable[Any]]]]
+    workers: int = 1
+    queue_size: int = 100
+
+@dataclass
+class StageMetrics:
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    max_depth: int = 0
+    depth_samples: List[int] = field(default_factory=list)
+
+    @property
+    def avg_depth(self) -> float:
+        return sum(self.depth_samples) / len(self.depth_samples) if self.depth_samples else 0.0
+
+class IngestPipeline:
+    """Runs items through a chain of stages connected by bounded asyncio queues."""
+
+    def __init__(self, stages: List[Stage], report_interval: float = 10.0):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.metrics = {stage.name: StageMetrics() for stage in stages}
+        self._queues: List[asyncio.Queue] = []
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+        queue = self._queues[index]
+        next_queue = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        metrics = self.metrics[stage.name]
+
+        while True:
+            item = await queue.get()
+            start = time.perf_counter()
+            try:
+                outputs = await stage.handler(item)
+                metrics.processed += 1
+                metrics.busy_seconds += time.perf_counter() - start
+                if next_queue is not None and outputs:
+                    for output in outputs:
+                        await next_queue.put(output)
+            except Exception as e:
+                metrics.errors += 1
+                print(f"Error in {stage.name} stage: {e}")
+            finally:
+                queue.task_done()
+
+    def _sample_depths(self):
+        for stage, queue in zip(self.stages, self._queues):
+            metrics = self.metrics[stage.name]
+            depth = queue.qsize()
+            metrics.depth_samples.append(depth)
+            metrics.max_depth = max(metrics.max_depth, depth)
+
+    async def _monitor(self):
+        last_report = time.perf_counter()
+        while True:
+            await asyncio.sleep(1.0)
+            self._sample_depths()
+            if time.perf_counter() - last_report >= self.report_interval:
+                last_report = time.perf_counter()
+                print("Queue depths: " + ", ".join(
+                    f"{stage.name}={queue.qsize()}/{stage.queue_size}"
+                    for stage, queue in zip(self.stages, self._queues)
+                ))
+
+    async def run(self, items: Iterable[Any]):
+        """Feed items into the first stage and wait until every stage has drained."""
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        workers = [
+            [asyncio.create_task(self._worker(i)) for _ in range(stage.workers)]
+            for i, stage in enumerate(self.stages)
+        ]
+        monitor = asyncio.create_task(self._monitor())
+
+        try:
+            for item in items:
+                await self._queues[0].put(item)
+
+            # Stages drain in order: once a stage's queue is joined, everything it
+            # produced is already queued in the next stage
+            for queue, stage_workers in zip(self._queues, workers):
+                await queue.join()
+                for task in stage_workers:
+                    task.cancel()
+        finally:
+            monitor.cancel()
+            for stage_workers in workers:
+                for task in stage_workers:
+                    task.cancel()
+            await asyncio.gather(monitor, *[t for ws in workers for t in ws], return_exceptions=True)
+
+    def summary(self) -> str:
+        """Return per-stage throughput and queue depth statistics."""
+        lines = ["Pipeline stages:"]
+        for stage in self.stages:
+            metrics = self.metrics[stage.name]
+            lines.append(
+                f"  - {stage.name}: {metrics.processed} items, {metrics.errors} errors, "
+                f"{stage.workers} workers, busy {metrics.busy_seconds:.1f}s, "
+                f"queue depth avg {metrics.avg_depth:.1f} / max {metrics.max_depth} of {stage.queue_size}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from site_pages_store import SitePagesStore
+
+@dataclass
+class CachedPage:
+    """The chunks of a page read so far, in order."""
+    url: str
+    title: str
+    version: Optional[str]
+    chunk_count: int
+    chunks: List[str] = field(default_factory=list)
+    size: int = 0  # UTF-8 bytes of `chunks`
+    complete: bool = False
+
+    def append(self, content: str):
+        self.chunks.append(content)
+        self.size += len(content.encode("utf-8"))
+
+class PageCache:
+    """
+    Size-bounded LRU cache of assembled documentation pages for get_page_content.
+
+    Entries are keyed by URL and tagged with the page's ingestion version (the
+    latest crawled_at of its chunks in site_pages_index), so a re-crawled page is
+    read again instead of served stale. The cache holds at most `max_bytes` of
+    page content; pages bigger than `max_entry_bytes` are only cached up to that
+    size, as a prefix that later reads continue from.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_entry_bytes: int = 2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages: "OrderedDict[str, CachedPage]" = OrderedDict()
+
+    def get(self, url: str, version: Optional[str]) -> Optional[CachedPage]:
+        page = self._pages.get(url)
+        if page is None or version is None or page.version != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(url)
+        return page
+
+    def put(self, page: CachedPage):
+        self.discard(page.url)
+        if page.version is None:
+            return
+        if page.size > self.max_entry_bytes:
+            prefix = CachedPage(url=page.url, title=page.title, version=page.version, chunk_count=page.chunk_count)
+            for content in page.chunks:
+                if prefix.size + len(content.encode("utf-8")) > self.max_entry_bytes:
+                    break
+                prefix.append(content)
+            if not prefix.chunks:
+                return
+            page = prefix
+        self._pages[page.url] = page
+        self.size += page.size
+        while self.size > self.max_bytes and self._pages:
+            _, evicted = self._pages.popitem(last=False)
+            self.size -= evicted.size
+
+    def discard(self, url: str):
+        page = self._pages.pop(url, None)
+        if page is not None:
+            self.size -= page.size
+
+async def read_page(
+    store: SitePagesStore,
+    cache: PageCache,
+    url: str,
+    source: str,
+    max_bytes: int = 0,
+    section_size: int = 20
+) -> Optional[CachedPage]:
+    """
+    Return a page's chunks, from the cache when possible.
+
+    Chunks are fetched from Supabase `section_size` rows at a time, and reading
+    stops once `max_bytes` of content (0 for no limit) is available, so a
+    budgeted read of a huge page only downloads its first sections. If the
+    page's version can't be looked up, it is read without the cache.
+
+    Returns:
+        Optional[CachedPage]: The page, with `complete` False if it was cut short, or None if it has no chunks
+    """
+    try:
+        entry = await store.page_entry(url, source)
+    except Exception as e:
+        # e.g. site_pages_index hasn't been created yet: read the chunks without the cache
+        print(f"Error reading site_pages_index, reading {url} uncached: {e}")
+        entry = None
+    version = entry['version'] if entry else None
+
+    page = cache.get(url, version)
+    if page is None:
+        page = CachedPage(url=url, title="", version=version, chunk_count=entry['chunk_count'] if entry else 0)
+    elif page.complete or (max_bytes and page.size >= max_bytes):
+        return page
+    else:
+        # Continue a cached prefix on a copy, so readers of the cached entry never see it change
+        page = CachedPage(
+            url=page.url, title=page.title, version=page.version, chunk_count=page.chunk_count,
+            chunks=list(page.chunks), size=page.size
+        )
+
+    while not (max_bytes and page.size >= max_bytes):
+        rows = await store.page_chunks(url, source, offset=len(page.chunks), limit=section_size)
+        if not page.title and rows:
+            page.title = rows[0]['title'].split(' - ')[0]
+        for row in rows:
+            page.append(row['content'])
+        if len(rows) < section_size:
+            page.complete = True
+            break
+
+    if not page.chunks:
+        return None
+    cache.put(page)
+    return page
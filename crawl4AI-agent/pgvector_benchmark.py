@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import struct
+import asyncio
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+from dotenv import load_dotenv
+
+SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site_pages.sql")
+BENCH_TABLE = "bench_site_pages"
+
+# Signatures of the search functions before ef_search was added, dropped by the migration
+OLD_FUNCTIONS = [
+    "match_site_pages(vector, integer, jsonb)",
+    "match_site_pages_hybrid(text, vector, integer, jsonb, integer, integer)",
+]
+
+def quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def encode_vector(vector) -> bytes:
+    """pgvector's binary format: dimensions, an unused int16, then big-endian float4 values."""
+    array = np.asarray(vector, dtype=">f4")
+    return struct.pack(">HH", len(array), 0) + array.tobytes()
+
+def decode_vector(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=">f4", offset=4).astype(np.float32)
+
+async def connect(database_url: str) -> asyncpg.Connection:
+    conn = await asyncpg.connect(database_url)
+    await conn.execute("create extension if not exists vector")
+    await conn.set_type_codec("vector", schema="public", encoder=encode_vector, decoder=decode_vector, format="binary")
+    return conn
+
+def function_definitions(sql: str) -> List[str]:
+    """Pull the `create function match_site_pages...` statements out of site_pages.sql."""
+    statements = re.findall(r"create function match_site_pages\w* \(.*?\n\$\$;", sql, re.DOTALL)
+    return [statement.replace("create function", "create or replace function", 1) for statement in statements]
+
+async def migrate(conn: asyncpg.Connection, m: int, ef_construction: int, per_source: bool):
+    """Replace ivfflat indexes on site_pages with HNSW, add the per-source index and install the current search functions."""
+    ivfflat = await conn.fetch(
+        "select indexname from pg_indexes where tablename = 'site_pages' and indexdef ilike '%using ivfflat%'"
+    )
+    for row in ivfflat:
+        print(f"Dropping ivfflat index {row['indexname']}")
+        await conn.execute(f'drop index concurrently if exists "{row["indexname"]}"')
+
+    print(f"Creating HNSW index (m={m}, ef_construction={ef_construction})")
+    start = time.perf_counter()
+    await conn.execute(
+        "create index concurrently if not exists idx_site_pages_embedding on site_pages "
+        f"using hnsw (embedding vector_cosine_ops) with (m = {m}, ef_construction = {ef_construction})"
+    )
+    print(f"  built in {time.perf_counter() - start:.1f}s")
+
+    await conn.execute(
+        "create index concurrently if not exists idx_site_pages_source "
+        "on site_pages ((metadata->>'source'), url, chunk_number)"
+    )
+
+    if per_source:
+        sources = await conn.fetch("select distinct metadata->>'source' as source from site_pages where metadata ? 'source'")
+        for row in sources:
+            name = "idx_site_pages_embedding_" + re.sub(r"\W", "_", row["source"])
+            print(f"Creating partial HNSW index {name}")
+            await conn.execute(
+                f'create index concurrently if not exists "{name}" on site_pages '
+                f"using hnsw (embedding vector_cosine_ops) with (m = {m}, ef_construction = {ef_construction}) "
+                f"where metadata->>'source' = {quote_literal(row['source'])}"
+            )
+
+    with open(SQL_PATH, encoding="utf-8") as f:
+        definitions = function_definitions(f.read())
+    async with conn.transaction():
+        for signature in OLD_FUNCTIONS:
+            await conn.execute(f"drop function if exists {signature}")
+        for definition in definitions:
+            await conn.execute(definition)
+    print(f"Installed {len(definitions)} search functions from site_pages.sql")
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator, centers: np.ndarray) -> np.ndarray:
+    """Unit vectors scattered around cluster centers, closer to real embeddings than uniform noise."""
+    assignment = rng.integers(0, clusters, size=count)
+    vectors = centers[assignment] + rng.normal(scale=0.6, size=(count, dim)).astype(np.float32) / np.sqrt(dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+async def load_corpus(conn: asyncpg.Connection, size: int, dim: int, sources: int, seed: int) -> np.ndarray:
+    """(Re)create the benchmark table with `size` synthetic rows; returns the cluster centers."""
+    rng = np.random.default_rng(seed)
+    clusters = max(size // 1000, 10)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    await conn.execute(f"drop table if exists {BENCH_TABLE}")
+    await conn.execute(f"""
+        create table {BENCH_TABLE} (
+            id bigint primary key,
+            source text not null,
+            metadata jsonb not null,
+            embedding vector({dim})
+        )
+    """)
+    start = time.perf_counter()
+    for offset in range(0, size, 10_000):
+        count = min(10_000, size - offset)
+        vectors = synthetic_vectors(count, dim, clusters, rng, centers)
+        source_ids = rng.integers(0, sources, size=count)
+        records = [
+            (offset + i, f"source_{source_ids[i]}", f'{{"source": "source_{source_ids[i]}"}}', vectors[i])
+            for i in range(count)
+        ]
+        await conn.copy_records_to_table(BENCH_TABLE, records=records, columns=["id", "source", "metadata", "embedding"])
+    await conn.execute(f"analyze {BENCH_TABLE}")
+    print(f"  loaded {size:,} rows in {time.perf_counter() - start:.1f}s")
+    return centers
+
+async def exact_neighbors(conn: asyncpg.Connection, query: np.ndarray, k: int, source: Optional[str]) -> List[int]:
+    """Ground truth by sequential scan; run before any vector index exists."""
+    where = f"where source = {quote_literal(source)}" if source else ""
+    rows = await conn.fetch(f"select id from {BENCH_TABLE} {where} order by embedding <=> $1 limit $2", query, k)
+    return [row["id"] for row in rows]
+
+async def ann_neighbors(
+    conn: asyncpg.Connection,
+    query: np.ndarray,
+    k: int,
+    ef_search: int,
+    source: Optional[str],
+    partial: bool
+) -> List[int]:
+    """The query shape match_site_pages uses: nearest ef_search candidates, then the filter."""
+    async with conn.transaction():
+        await conn.execute(f"set local hnsw.ef_search = {max(ef_search, k)}")
+        if source and partial:
+            # Literal predicate, so the planner can pick the source's partial index
+            sql = f"""
+                select id from {BENCH_TABLE}
+                where metadata->>'source' = {quote_literal(source)}
+                order by embedding <=> $1 limit $2
+            """
+            rows = await conn.fetch(sql, query, k)
+        else:
+            rows = await conn.fetch(f"""
+                with candidates as (
+                    select id, metadata, embedding <=> $1 as distance
+                    from {BENCH_TABLE}
+                    order by embedding <=> $1
+                    limit $2
+                )
+                select id from candidates
+                where metadata @> $3::jsonb
+                order by distance
+                limit $4
+            """, query, max(ef_search, k), f'{{"source": "{source}"}}' if source else "{}", k)
+    return [row["id"] for row in rows]
+
+def percentile_ms(latencies: List[float], q: float) -> float:
+    return float(np.percentile(latencies, q) * 1000)
+
+async def benchmark_size(conn: asyncpg.Connection, args: argparse.Namespace, size: int):
+    print(f"\n{size:,} rows, {args.dim} dimensions, {args.sources} sources")
+    centers = await load_corpus(conn, size, args.dim, args.sources, args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = synthetic_vectors(args.queries, args.dim, len(centers), rng, centers)
+    query_sources = [f"source_{rng.integers(0, args.sources)}" for _ in range(args.queries)]
+
+    print("  computing exact neighbors")
+    truth: Dict[Tuple[int, bool], List[int]] = {}
+    for i, query in enumerate(queries):
+        truth[(i, False)] = await exact_neighbors(conn, query, args.k, None)
+        truth[(i, True)] = await exact_neighbors(conn, query, args.k, query_sources[i])
+
+    start = time.perf_counter()
+    await conn.execute(
+        f"create index on {BENCH_TABLE} using hnsw (embedding vector_cosine_ops) "
+        f"with (m = {args.m}, ef_construction = {args.ef_construction})"
+    )
+    print(f"  HNSW index (m={args.m}, ef_construction={args.ef_construction}) built in {time.perf_counter() - start:.1f}s")
+    if args.per_source:
+        start = time.perf_counter()
+        for source in range(args.sources):
+            await conn.execute(
+                f"create index on {BENCH_TABLE} using hnsw (embedding vector_cosine_ops) "
+                f"with (m = {args.m}, ef_construction = {args.ef_construction}) "
+                f"where metadata->>'source' = 'source_{source}'"
+            )
+        print(f"  {args.sources} partial per-source indexes built in {time.perf_counter() - start:.1f}s")
+
+    print(f"  {'query':<22}{'ef_search':>10}{f'recall@{args.k}':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    cases = [("unfiltered", False, False), ("filtered, post-filter", True, False)]
+    if args.per_source:
+        cases.append(("filtered, partial idx", True, True))
+    for name, filtered, partial in cases:
+        for ef_search in args.ef_search:
+            recalls, latencies = [], []
+            for i, query in enumerate(queries):
+                start = time.perf_counter()
+                found = await ann_neighbors(conn, query, args.k, ef_search, query_sources[i] if filtered else None, partial)
+                latencies.append(time.perf_counter() - start)
+                expected = truth[(i, filtered)]
+                recalls.append(len(set(found) & set(expected)) / len(expected) if expected else 1.0)
+            print(
+                f"  {name:<22}{ef_search:>10}{np.mean(recalls):>12.3f}"
+                f"{percentile_ms(latencies, 50):>10.2f}{percentile_ms(latencies, 95):>10.2f}"
+            )
+
+    if not args.keep:
+        await conn.execute(f"drop table {BENCH_TABLE}")
+
+async def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--database-url", default=None, help="Postgres connection string (default: DATABASE_URL)")
+    common.add_argument("--m", type=int, default=16, help="HNSW graph degree")
+    common.add_argument("--ef-construction", type=int, default=64, help="HNSW build-time candidate list size")
+    common.add_argument("--per-source", action="store_true", help="Also create a partial HNSW index per metadata source")
+
+    parser = argparse.ArgumentParser(description="Migrate site_pages to HNSW and benchmark pgvector search.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "migrate",
+        parents=[common],
+        help="Replace the ivfflat index on site_pages with HNSW and update the search functions"
+    )
+
+    bench = commands.add_parser(
+        "benchmark",
+        parents=[common],
+        help="Measure recall and latency on synthetic corpora in a scratch table"
+    )
+    bench.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    bench.add_argument("--dim", type=int, default=1536)
+    bench.add_argument("--queries", type=int, default=100)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--ef-search", type=int, nargs="+", default=[40, 100, 200])
+    bench.add_argument("--sources", type=int, default=4, help="Distinct metadata sources for filtered queries")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--keep", action="store_true", help=f"Keep the {BENCH_TABLE} table afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    database_url = args.database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+
+    conn = await connect(database_url)
+    try:
+        if args.command == "migrate":
+            await migrate(conn, args.m, args.ef_construction, args.per_source)
+        else:
+            # Bigger builds go much faster with more memory and parallel workers
+            await conn.execute("set maintenance_work_mem = '2GB'")
+            await conn.execute("set max_parallel_maintenance_workers = 7")
+            for size in args.sizes:
+                await benchmark_size(conn, args, size)
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
 from __future__ import annotations as _annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 import logfire
 import asyncio
@@ -9,8 +9,16 @@ import os
 
 from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.models.openai import OpenAIModel
+from openai import AsyncOpenAI
 from supabase import Client
-from typing import List
+from typing import List, Optional
+
+from vector_index import LocalVectorIndex
+from query_cache import QueryEmbeddingCache
+from site_pages_store import SitePagesStore
+from page_cache import PageCache, read_page
+from context_budget import ContextBudget
+from sources import DEFAULT_SOURCE, load_sources
 
 load_dotenv()
 
@@ -19,10 +27,49 @@ model = OpenAIModel(llm)
 
 logfire.configure(send_to_logfire='if-token-present')
 
+embedding_model = "text-embedding-3-small"
+
+# Queries are embedded with the model their source's chunks were embedded with
+sources = load_sources()
+
+# "vector" ranks chunks by embedding similarity only, "hybrid" also by full-text match
+retrieval_mode = os.getenv('RETRIEVAL_MODE', 'vector')
+
+# Repeated queries within and across conversations reuse their embedding
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.getenv('QUERY_CACHE_TTL_SECONDS', '86400')),
+    path=os.getenv('QUERY_CACHE_PATH') or None
+)
+
+# Token budget for the RAG tool's output. Passages are ranked with BM25 ("lexical")
+# or with one extra embedding request per call ("embedding")
+context_budget = ContextBudget(max_tokens=int(os.getenv('RETRIEVAL_CONTEXT_TOKENS', '2000')))
+context_trim_scorer = os.getenv('RETRIEVAL_TRIM_SCORER', 'lexical')
+
+# Assembled pages for get_page_content, invalidated when a page is re-crawled
+page_cache = PageCache(
+    max_bytes=int(os.getenv('PAGE_CACHE_MAX_MB', '32')) * 1024 * 1024,
+    max_entry_bytes=int(os.getenv('PAGE_CACHE_MAX_PAGE_MB', '2')) * 1024 * 1024
+)
+
 @dataclass
 class PydanticAIDeps:
     supabase: Client
     openai_client: AsyncOpenAI
+    # Optional in-process copy of the embeddings, used instead of the match_site_pages RPC
+    vector_index: Optional[LocalVectorIndex] = None
+    # The source in sources.json whose pages the tools search and read
+    source: str = DEFAULT_SOURCE
+    # Non-blocking access to site_pages, built from `supabase`
+    store: SitePagesStore = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.store = SitePagesStore(self.supabase)
+
+    @property
+    def embedding_model(self) -> str:
+        return sources[self.source].embedding_model if self.source in sources else embedding_model
 
 system_prompt = """
 You are an expert at Pydantic AI - a Python AI agent framework that you have access to all the documentation to,
@@ -45,14 +92,17 @@ pydantic_ai_agent = Agent(
     retries=2
 )
 
-async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
+async def get_embedding(text: str, openai_client: AsyncOpenAI, model: str = embedding_model) -> List[float]:
+    """Get embedding vector from OpenAI, or from the query cache when the query was seen recently."""
+    async def create_embedding() -> List[float]:
         response = await openai_client.embeddings.create(
-            model="text-embedding-3-small",
+            model=model,
             input=text
         )
         return response.data[0].embedding
+
+    try:
+        return await query_embedding_cache.get(text, model, create_embedding)
     except Exception as e:
         print(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
@@ -71,99 +121,135 @@ async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_
     """
     try:
         # Get the embedding for the query
-        query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
+        query_embedding = await get_embedding(user_query, ctx.deps.openai_client, ctx.deps.embedding_model)
         
-        # Query Supabase for relevant documents
-        result = ctx.deps.supabase.rpc(
-            'match_site_pages',
-            {
-                'query_embedding': query_embedding,
-                'match_count': 5,
-                'filter': {'source': 'pydantic_ai_docs'}
-            }
-        ).execute()
+        if ctx.deps.vector_index is not None and retrieval_mode == 'hybrid':
+            # Fuse vector and BM25 rankings from the local index
+            matches = ctx.deps.vector_index.hybrid_search(
+                user_query,
+                query_embedding,
+                match_count=5,
+                filter={'source': ctx.deps.source}
+            )
+        elif ctx.deps.vector_index is not None:
+            # Search the local index, no database round trip
+            matches = ctx.deps.vector_index.search(
+                query_embedding,
+                match_count=5,
+                filter={'source': ctx.deps.source}
+            )
+        elif retrieval_mode == 'hybrid':
+            # Fuse vector and full-text rankings in Postgres
+            matches = await ctx.deps.store.match_hybrid(
+                user_query,
+                query_embedding,
+                match_count=5,
+                filter={'source': ctx.deps.source}
+            )
+        else:
+            # Query Supabase for relevant documents
+            matches = await ctx.deps.store.match(
+                query_embedding,
+                match_count=5,
+                filter={'source': ctx.deps.source}
+            )
         
-        if not result.data:
+        if not matches:
             return "No relevant documentation found."
             
-        # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# {doc['title']}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-            
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
+        async def embed_passages(passages: List[str]) -> List[List[float]]:
+            response = await ctx.deps.openai_client.embeddings.create(model=ctx.deps.embedding_model, input=passages)
+            return [item.embedding for item in response.data]
+
+        # Format the results, keeping the most relevant passages within the token budget
+        return await context_budget.fit(
+            user_query,
+            matches,
+            query_embedding,
+            embed=embed_passages if context_trim_scorer == 'embedding' else None
+        )
         
     except Exception as e:
         print(f"Error retrieving documentation: {e}")
         return f"Error retrieving documentation: {str(e)}"
 
 @pydantic_ai_agent.tool
-async def list_documentation_pages(ctx: RunContext[PydanticAIDeps]) -> List[str]:
+async def list_documentation_pages(
+    ctx: RunContext[PydanticAIDeps],
+    prefix: str = "",
+    page: int = 1,
+    page_size: int = 50
+) -> str:
     """
-    Retrieve a list of all available Pydantic AI documentation pages.
+    Retrieve a list of the available Pydantic AI documentation pages with their titles.
     
+    Args:
+        ctx: The context including the Supabase client
+        prefix: Only list pages whose URL starts with this, or whose path does if it starts with "/" (e.g. "/api/")
+        page: Which page of results to return, starting at 1
+        page_size: How many documentation pages to list per page of results (at most 200)
+        
     Returns:
-        List[str]: List of unique URLs for all documentation pages
+        str: One line per documentation page (URL, title and number of chunks), and how many pages there are in total
     """
     try:
-        # Query Supabase for unique URLs where source is pydantic_ai_docs
-        result = ctx.deps.supabase.from_('site_pages') \
-            .select('url') \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .execute()
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), 200)
+        offset = (page - 1) * page_size
+
+        # Query the page index for distinct URLs of the agent's source
+        rows, total = await ctx.deps.store.list_pages(ctx.deps.source, prefix, offset, page_size)
         
-        if not result.data:
-            return []
-            
-        # Extract unique URLs
-        urls = sorted(set(doc['url'] for doc in result.data))
-        return urls
+        if not rows:
+            return f"No documentation pages found{f' starting with {prefix}' if prefix else ''}."
+
+        lines = [f"Pages {offset + 1}-{offset + len(rows)} of {total}:"]
+        for row in rows:
+            title = row['title'].split(' - ')[0]
+            lines.append(f"{row['url']} - {title} ({row['chunk_count']} chunks)")
+        if offset + len(rows) < total:
+            lines.append(f"Call again with page={page + 1} for more.")
+        return "\n".join(lines)
         
     except Exception as e:
         print(f"Error retrieving documentation pages: {e}")
-        return []
+        return f"Error retrieving documentation pages: {str(e)}"
 
 @pydantic_ai_agent.tool
-async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str) -> str:
+async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str, max_kb: int = 0) -> str:
     """
     Retrieve the full content of a specific documentation page by combining all its chunks.
     
     Args:
         ctx: The context including the Supabase client
         url: The URL of the page to retrieve
+        max_kb: Only return roughly the first max_kb kilobytes of the page, 0 for the whole page.
+            Use this for very large pages (e.g. API references).
         
     Returns:
-        str: The complete page content with all chunks combined in order
+        str: The page content with its chunks combined in order, cut short if max_kb was reached
     """
     try:
-        # Query Supabase for all chunks of this URL, ordered by chunk_number
-        result = ctx.deps.supabase.from_('site_pages') \
-            .select('title, content, chunk_number') \
-            .eq('url', url) \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .order('chunk_number') \
-            .execute()
+        max_bytes = max(max_kb, 0) * 1024
+        # Chunks of this URL in chunk_number order, from the page cache when the page hasn't changed
+        page = await read_page(ctx.deps.store, page_cache, url, ctx.deps.source, max_bytes)
         
-        if not result.data:
+        if page is None:
             return f"No content found for URL: {url}"
             
         # Format the page with its title and all chunks
-        page_title = result.data[0]['title'].split(' - ')[0]  # Get the main title
-        formatted_content = [f"# {page_title}\n"]
+        formatted_content = [f"# {page.title}\n"]
         
         # Add each chunk's content
-        for chunk in result.data:
-            formatted_content.append(chunk['content'])
+        formatted_content.extend(page.chunks)
             
         # Join everything together
-        return "\n\n".join(formatted_content)
+        content = "\n\n".join(formatted_content)
+        if max_bytes and (len(content.encode("utf-8")) > max_bytes or not page.complete):
+            content = content.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+            content += f"\n\n[Showing the first {max_kb} KB of a {page.chunk_count}-chunk page. Call again with a larger max_kb to read more.]"
+        return content
         
     except Exception as e:
         print(f"Error retrieving page content: {e}")
-        return f"Error retrieving page content: {str(e)}"
\ No newline at end of file
+        return f"Error retrieving page content: {str(e)}"
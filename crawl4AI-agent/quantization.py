@@ -0,0 +1,50 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Rows converted back to float32 at a time when scoring; small enough to stay in CPU cache
+BLOCK_ROWS = 1024
+
+def quantize(matrix: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compress a float32 embedding matrix.
+
+    float16 halves the size. int8 is symmetric scalar quantization per row:
+    each row is scaled so its largest component maps to 127, and the float32
+    scale is kept alongside, close to a 4x reduction.
+
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: The codes and, for int8, the per-row scales
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if precision == "float16":
+        return matrix.astype(np.float16), None
+
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    scales = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+        peak = np.abs(block).max(axis=1) if block.size else np.zeros(len(block), dtype=np.float32)
+        scale = np.where(peak == 0, 1, peak / 127).astype(np.float32)
+        codes[start:start + BLOCK_ROWS] = np.rint(block / scale[:, None]).astype(np.int8)
+        scales[start:start + BLOCK_ROWS] = scale
+    return codes, scales
+
+def approximate_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """Dot products of every compressed row with a float32 query, a block of rows at a time."""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        block = codes[start:start + BLOCK_ROWS].astype(np.float32)
+        scores[start:start + BLOCK_ROWS] = block @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+def bytes_per_row(precision: str, dimensions: int) -> int:
+    """Memory one embedding takes at a precision."""
+    return {"float32": 4 * dimensions, "float16": 2 * dimensions, "int8": dimensions + 4}[precision]
@@ -0,0 +1,142 @@
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+class QueryEmbeddingCache:
+    """
+    LRU + TTL cache of query embeddings for the RAG tool.
+
+    Entries are keyed on the model and the normalized query text. Concurrent
+    lookups of the same key on the same event loop share a single embedding
+    request; lookups from other loops (e.g. other Streamlit sessions) fetch
+    their own, since a task can only be awaited on its loop. The cache itself
+    is safe to use from several threads. With a `path`,
+    entries are also written to SQLite so they survive restarts and are shared
+    between processes; entries older than `ttl` seconds are ignored and replaced.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        # In-flight fetches by (event loop, key)
+        self._in_flight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        # Guards the entries and the SQLite connection, which are shared between threads
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            # Web apps may look entries up from a different thread than the one that created the cache
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.execute("""
+                create table if not exists query_embeddings (
+                    key text primary key,
+                    embedding text not null,
+                    created_at real not null
+                )
+            """)
+            self._conn.commit()
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "select created_at, embedding from query_embeddings where key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._put(key, entry)
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: str, embedding: List[float]):
+        created_at = time.time()
+        with self._lock:
+            self._put(key, (created_at, embedding))
+            if self._conn is not None:
+                self._conn.execute(
+                    "insert or replace into query_embeddings (key, embedding, created_at) values (?, ?, ?)",
+                    (key, json.dumps(embedding), created_at)
+                )
+                self._conn.commit()
+
+    def _put(self, key: str, entry: Tuple[float, List[float]]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, text: str, model: str, load: Callable[[], Awaitable[List[float]]]) -> List[float]:
+        """
+        Return the cached embedding for a query, calling `load()` on a miss.
+
+        Args:
+            text: The query text
+            model: The embedding model, part of the cache key
+            load: Coroutine function that fetches the embedding
+
+        Returns:
+            List[float]: The embedding. Errors from `load()` are raised to every
+            caller waiting on it and nothing is cached.
+        """
+        key = f"{model}:{normalize_query(text)}"
+        embedding = self._lookup(key)
+        if embedding is not None:
+            self.hits += 1
+            return embedding
+
+        # Someone on this loop is already fetching this query, wait for their result
+        flight_key = (asyncio.get_running_loop(), key)
+        in_flight = self._in_flight.get(flight_key)
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(load())
+        self._in_flight[flight_key] = task
+        # Store from a callback so the result is kept even if the first caller is cancelled
+        task.add_done_callback(lambda done: self._finish(flight_key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key: Tuple[asyncio.AbstractEventLoop, str], task: asyncio.Future):
+        self._in_flight.pop(flight_key, None)
+        key = flight_key[1]
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
+
+    def summary(self) -> str:
+        """Return a one-line summary of the cache's activity."""
+        lookups = self.hits + self.misses + self.coalesced
+        hit_rate = (self.hits + self.coalesced) / lookups if lookups else 0
+        return (
+            f"Query embedding cache: {self.hits} hits, {self.coalesced} coalesced, "
+            f"{self.misses} misses ({hit_rate:.0%} served without a request), {len(self._entries)} entries"
+        )
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
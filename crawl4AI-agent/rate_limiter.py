@@ -0,0 +1,148 @@
+import re
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI's x-ratelimit-reset-* header ("20ms", "1s", "6m0s") into seconds."""
+    if not value:
+        return None
+    seconds = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds if matched else None
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for OpenAI requests.
+
+    The number of requests allowed in flight grows by roughly one per round of
+    successful requests (additive increase) and is cut by `decrease_factor` when
+    OpenAI answers with a 429 or the request times out (multiplicative decrease).
+    The x-ratelimit-* response headers stop growth when the remaining quota is
+    low and pause new requests until the quota resets once it runs out.
+    Failed requests are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+        max_attempts: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            async with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def _release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _increase(self, headers: Any):
+        remaining_requests = headers.get("x-ratelimit-remaining-requests") if headers else None
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens") if headers else None
+
+        # Out of quota: hold off new requests until the window resets
+        if remaining_requests == "0" or remaining_tokens == "0":
+            reset = max(
+                parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0
+            )
+            self._paused_until = max(self._paused_until, time.monotonic() + reset)
+            return
+
+        # Don't grow past what the remaining request quota allows
+        if remaining_requests is not None and remaining_requests.isdigit() and int(remaining_requests) <= self.limit:
+            return
+
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, started_at: float, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        # Requests sent before the last decrease were sent at the old limit, so a
+        # burst of failures from the same round only cuts the limit once
+        if started_at > self._last_decrease:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, make_request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run an OpenAI `with_raw_response` request under the limiter and return the parsed response.
+
+        Raises the last error once `max_attempts` attempts have failed.
+        """
+        for attempt in range(self.max_attempts):
+            await self._acquire()
+            started_at = time.monotonic()
+            try:
+                self.requests += 1
+                raw_response = await make_request()
+            except RateLimitError as e:
+                self.rate_limited += 1
+                headers = e.response.headers if e.response is not None else {}
+                retry_after = headers.get("retry-after")
+                self._decrease(started_at, float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None)
+                error = e
+            except (APITimeoutError, APIConnectionError, InternalServerError) as e:
+                self._decrease(started_at)
+                error = e
+            else:
+                self._increase(raw_response.headers)
+                return raw_response.parse()
+            finally:
+                await self._release()
+
+            if attempt + 1 < self.max_attempts:
+                self.retries += 1
+                delay = self._backoff(attempt)
+                print(f"OpenAI request failed ({type(error).__name__}), retrying in {delay:.1f}s with concurrency {int(self.limit)}")
+                await asyncio.sleep(delay)
+
+        raise error
+
+    def summary(self) -> str:
+        """Return a one-line summary of the limiter's activity."""
+        return (
+            f"OpenAI limiter: {self.requests} requests, {self.rate_limited} rate limited, "
+            f"{self.retries} retries, concurrency now {int(self.limit)} (peak {int(self.peak_limit)})"
+        )
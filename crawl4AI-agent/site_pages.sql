@@ -12,22 +12,47 @@ create table site_pages (
     metadata jsonb not null default '{}'::jsonb,  -- Added metadata column
     embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    -- Full-text search over title and content, for exact API names the embeddings miss
+    fts tsvector generated always as (
+      setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+      setweight(to_tsvector('english', content), 'B')
+    ) stored,
     
     -- Add a unique constraint to prevent duplicate chunks for the same URL
     unique(url, chunk_number)
 );
 
--- Create an index for better vector similarity search performance
-create index on site_pages using ivfflat (embedding vector_cosine_ops);
+-- Create an HNSW index for vector similarity search. Unlike ivfflat it needs no
+-- training data, so it can be created on the empty table and keeps its recall as
+-- the table grows. m and ef_construction trade build time and size for recall.
+create index idx_site_pages_embedding on site_pages using hnsw (embedding vector_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+-- With several sources in sources.json, a partial index per source keeps each
+-- agent's searches inside its own source instead of filtering the nearest chunks
+-- of all sources (`python pgvector_benchmark.py migrate --per-source` creates them):
+-- create index on site_pages using hnsw (embedding vector_cosine_ops)
+--   where metadata->>'source' = 'pydantic_ai_docs';
 
 -- Create an index on metadata for faster filtering
 create index idx_site_pages_metadata on site_pages using gin (metadata);
 
--- Create a function to search for documentation chunks
+-- Reads and deletes of one source's pages, and local index syncs, go through this
+create index idx_site_pages_source on site_pages ((metadata->>'source'), url, chunk_number);
+
+-- Create an index for full-text search
+create index idx_site_pages_fts on site_pages using gin (fts);
+
+-- Create a function to search for documentation chunks.
+-- The nearest ef_search chunks are taken from the HNSW index first and the
+-- metadata filter is applied to those candidates, since a jsonb filter inside
+-- the ordered scan keeps Postgres from using the index. A "source" filter is
+-- also inlined as a literal so a per-source partial index can be used.
 create function match_site_pages (
   query_embedding vector(1536),
   match_count int default 10,
-  filter jsonb DEFAULT '{}'::jsonb
+  filter jsonb DEFAULT '{}'::jsonb,
+  ef_search int default 100
 ) returns table (
   id bigint,
   url varchar,
@@ -40,22 +65,125 @@ create function match_site_pages (
 )
 language plpgsql
 as $$
-#variable_conflict use_column
 begin
-  return query
+  -- An HNSW scan returns at most hnsw.ef_search rows
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  return query execute format($query$
+    with candidates as (
+      select site_pages.id, site_pages.embedding <=> $1 as distance
+      from site_pages
+      where site_pages.embedding is not null %s
+      order by site_pages.embedding <=> $1
+      limit $2
+    )
+    select
+      site_pages.id,
+      site_pages.url,
+      site_pages.chunk_number,
+      site_pages.title,
+      site_pages.summary,
+      site_pages.content,
+      site_pages.metadata,
+      1 - candidates.distance as similarity
+    from candidates
+    join site_pages on site_pages.id = candidates.id
+    where site_pages.metadata @> $3
+    order by candidates.distance
+    limit $4
+  $query$,
+    case when filter ? 'source'
+      then format('and site_pages.metadata->>''source'' = %L', filter->>'source')
+      else ''
+    end
+  )
+  using query_embedding, greatest(ef_search, match_count), filter, match_count;
+end;
+$$;
+
+-- Hybrid search: the vector ranking and the full-text ranking are fused with
+-- reciprocal rank fusion, so a chunk scores sum(1 / (rrf_k + rank)) over both
+create function match_site_pages_hybrid (
+  query_text text,
+  query_embedding vector(1536),
+  match_count int default 10,
+  filter jsonb default '{}'::jsonb,
+  candidate_count int default 20,
+  rrf_k int default 60,
+  ef_search int default 100
+) returns table (
+  id bigint,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  similarity float,
+  score float
+)
+language sql
+as $$
+with vector_matches as (
   select
-    id,
-    url,
-    chunk_number,
-    title,
-    summary,
-    content,
-    metadata,
-    1 - (site_pages.embedding <=> query_embedding) as similarity
+    matches.id,
+    row_number() over (order by matches.similarity desc) as rank
+  from match_site_pages(query_embedding, candidate_count, filter, ef_search) as matches
+),
+text_matches as (
+  select
+    site_pages.id,
+    row_number() over (order by ts_rank_cd(site_pages.fts, websearch_to_tsquery('english', query_text)) desc) as rank
   from site_pages
-  where metadata @> filter
-  order by site_pages.embedding <=> query_embedding
-  limit match_count;
+  where site_pages.metadata @> filter
+    and site_pages.embedding is not null
+    and site_pages.fts @@ websearch_to_tsquery('english', query_text)
+  order by ts_rank_cd(site_pages.fts, websearch_to_tsquery('english', query_text)) desc
+  limit candidate_count
+)
+select
+  site_pages.id,
+  site_pages.url,
+  site_pages.chunk_number,
+  site_pages.title,
+  site_pages.summary,
+  site_pages.content,
+  site_pages.metadata,
+  1 - (site_pages.embedding <=> query_embedding) as similarity,
+  coalesce(1.0 / (rrf_k + vector_matches.rank), 0.0) +
+    coalesce(1.0 / (rrf_k + text_matches.rank), 0.0) as score
+from vector_matches
+full outer join text_matches on vector_matches.id = text_matches.id
+join site_pages on site_pages.id = coalesce(vector_matches.id, text_matches.id)
+order by score desc
+limit match_count;
+$$;
+
+-- One row per page, so listing documentation pages doesn't read every chunk.
+-- The crawler refreshes it through refresh_site_pages_index() after each run.
+create materialized view site_pages_index as
+select
+  url,
+  metadata->>'source' as source,
+  metadata->>'url_path' as url_path,
+  (array_agg(title order by chunk_number))[1] as title,
+  count(*) as chunk_count,
+  max(created_at) as updated_at,
+  -- Changes whenever any chunk of the page is rewritten, used to invalidate cached pages
+  max(metadata->>'crawled_at') as version
+from site_pages
+group by url, metadata->>'source', metadata->>'url_path';
+
+-- A unique index is required to refresh the view concurrently
+create unique index on site_pages_index (source, url);
+create index on site_pages_index (source, url_path text_pattern_ops);
+
+create function refresh_site_pages_index()
+returns void
+language plpgsql
+security definer
+as $$
+begin
+  refresh materialized view concurrently site_pages_index;
 end;
 $$;
 
@@ -69,4 +197,9 @@ create policy "Allow public read access"
   on site_pages
   for select
   to public
-  using (true);
\ No newline at end of file
+  using (true);
+-- Materialized views have no RLS, so grant reads on the page index explicitly
+grant select on site_pages_index to anon, authenticated;
+
+-- Only the service role (used by the crawler) may rebuild it
+revoke execute on function refresh_site_pages_index() from public, anon, authenticated;
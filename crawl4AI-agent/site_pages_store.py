@@ -0,0 +1,143 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from supabase import Client
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool shared by every SitePagesStore in the process.
+
+    Sized by SUPABASE_MAX_WORKERS, which caps how many Supabase requests are in
+    flight at once no matter how many agent runs are active.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SUPABASE_MAX_WORKERS", "16")),
+            thread_name_prefix="supabase"
+        )
+    return _executor
+
+class SitePagesStore:
+    """
+    Async access to the site_pages table for agent tools.
+
+    supabase-py's `.execute()` is blocking, so calling it from an async tool
+    stalls the event loop and every other conversation with it. Each query here
+    runs on a shared thread pool instead, so concurrent tool calls overlap
+    their database round trips. The store itself holds no resources and is
+    cheap to create per request.
+    """
+
+    def __init__(self, supabase: Client, table: str = "site_pages"):
+        self.supabase = supabase
+        self.table = table
+
+    async def run(self, query: Callable[[], T]) -> T:
+        """Run any blocking supabase-py call on the shared pool, for queries not covered below."""
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), query)
+
+    async def match(
+        self,
+        query_embedding: List[float],
+        match_count: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the chunks most similar to the query embedding (the match_site_pages RPC)."""
+        result = await self.run(lambda: self.supabase.rpc(
+            'match_site_pages',
+            {
+                'query_embedding': query_embedding,
+                'match_count': match_count,
+                'filter': filter or {}
+            }
+        ).execute())
+        return result.data or []
+
+    async def match_hybrid(
+        self,
+        query_text: str,
+        query_embedding: List[float],
+        match_count: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the best chunks by fused vector and full-text rank (the match_site_pages_hybrid RPC)."""
+        result = await self.run(lambda: self.supabase.rpc(
+            'match_site_pages_hybrid',
+            {
+                'query_text': query_text,
+                'query_embedding': query_embedding,
+                'match_count': match_count,
+                'filter': filter or {}
+            }
+        ).execute())
+        return result.data or []
+
+    async def list_pages(
+        self,
+        source: str,
+        prefix: str = "",
+        offset: int = 0,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Return one page of the site_pages_index view and the total number of matching pages.
+
+        Args:
+            source: Only list pages from this source
+            prefix: Only list pages whose URL (or URL path, if it starts with "/") starts with this
+            offset: Number of pages to skip, in URL order
+            limit: Maximum number of pages to return
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: Rows with url, title and chunk_count, and the total count
+        """
+        def query():
+            builder = self.supabase.from_('site_pages_index') \
+                .select('url, title, chunk_count', count='exact') \
+                .eq('source', source)
+            if prefix:
+                # URLs are full of underscores, which LIKE would treat as wildcards
+                pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                builder = builder.like('url_path' if prefix.startswith('/') else 'url', pattern)
+            return builder.order('url').range(offset, offset + limit - 1).execute()
+
+        result = await self.run(query)
+        return result.data or [], result.count or 0
+
+    async def page_entry(self, url: str, source: str) -> Optional[Dict[str, Any]]:
+        """Return a page's row in site_pages_index (title, chunk_count and version), or None."""
+        result = await self.run(lambda: self.supabase.from_('site_pages_index')
+            .select('title, chunk_count, version')
+            .eq('url', url)
+            .eq('source', source)
+            .limit(1)
+            .execute())
+        return result.data[0] if result.data else None
+
+    async def page_chunks(
+        self,
+        url: str,
+        source: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the title, content and chunk_number of a page's chunks in order, optionally a slice of them."""
+        def query():
+            builder = self.supabase.from_(self.table) \
+                .select('title, content, chunk_number') \
+                .eq('url', url) \
+                .eq('metadata->>source', source) \
+                .order('chunk_number')
+            if limit is not None:
+                builder = builder.range(offset, offset + limit - 1)
+            return builder.execute()
+
+        result = await self.run(query)
+        return result.data or []
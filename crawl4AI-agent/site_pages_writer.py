@@ -0,0 +1,112 @@
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+from dataclasses import asdict
+
+from supabase import Client
+
+class SitePagesWriter:
+    """
+    Buffers processed chunks and writes them to Supabase as multi-row upserts.
+
+    A flush happens once `batch_size` rows are buffered or `flush_interval`
+    seconds after the first buffered row, whichever comes first. The blocking
+    supabase-py call runs in a worker thread so it never stalls the event loop,
+    and upserting on (url, chunk_number) lets re-crawled pages overwrite their
+    existing rows instead of failing on the unique constraint. Rows of chunk
+    numbers a page no longer has are not touched; the crawler deletes them once
+    the page is written.
+
+    `on_written`, if given, is called on the event loop with the rows of every
+    successful upsert.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        table: str = "site_pages",
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        on_conflict: str = "url,chunk_number",
+        on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ):
+        self.supabase = supabase
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_conflict = on_conflict
+        self.on_written = on_written
+        self.rows_written = 0
+        self.upserts = 0
+        self.errors = 0
+        self.write_seconds = 0.0
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._flush_handle = None
+        self._in_flight = set()
+        self._started_at = None
+
+    async def add(self, chunk: Any):
+        """Buffer a ProcessedChunk, flushing (and waiting for it) if the buffer is full."""
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        self._rows.append(asdict(chunk))
+
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_in_background)
+
+    def _flush_in_background(self):
+        self._flush_handle = None
+        task = asyncio.ensure_future(self.flush())
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def flush(self):
+        """Write everything buffered so far."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._rows:
+            return
+
+        rows, self._rows = self._rows, []
+        async with self._lock:
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                written = await asyncio.to_thread(self._upsert, batch)
+                if written and self.on_written:
+                    self.on_written(batch)
+
+    def _upsert(self, rows: List[Dict[str, Any]]) -> bool:
+        start = time.perf_counter()
+        try:
+            self.supabase.table(self.table).upsert(rows, on_conflict=self.on_conflict).execute()
+            self.rows_written += len(rows)
+            self.upserts += 1
+            print(f"Upserted {len(rows)} chunks into {self.table}")
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"Error upserting {len(rows)} chunks: {e}")
+            return False
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+    async def close(self):
+        """Flush remaining rows and wait for background flushes to finish."""
+        await self.flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def summary(self) -> str:
+        """Return a one-line summary of write throughput."""
+        if not self.upserts:
+            return f"Site pages writer: no rows written, {self.errors} errors"
+        elapsed = time.perf_counter() - self._started_at
+        return (
+            f"Site pages writer: {self.rows_written} rows in {self.upserts} upserts, "
+            f"{self.rows_written / elapsed:.1f} rows/s overall, "
+            f"{self.rows_written / self.write_seconds:.1f} rows/s while writing, {self.errors} errors"
+        )
@@ -0,0 +1,50 @@
+import os
+import json
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+SOURCES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json")
+DEFAULT_SOURCE = "pydantic_ai_docs"
+
+@dataclass
+class Source:
+    """
+    A documentation site crawled into site_pages, stored under metadata.source = name.
+
+    Chunking parameters left unset fall back to CHUNK_MAX_TOKENS and
+    CHUNK_OVERLAP_TOKENS. The embedding model must return 1536-dimension
+    vectors to fit the site_pages.embedding column.
+    """
+    name: str
+    sitemap_url: str
+    # Only sitemap URLs starting with this are crawled
+    url_prefix: str = ""
+    chunk_max_tokens: Optional[int] = None
+    chunk_overlap_tokens: Optional[int] = None
+    embedding_model: str = "text-embedding-3-small"
+
+DEFAULT_SOURCES = [Source(DEFAULT_SOURCE, "https://ai.pydantic.dev/sitemap.xml")]
+
+def load_sources(path: Optional[str] = None) -> Dict[str, Source]:
+    """
+    Load the source registry.
+
+    Args:
+        path: JSON file with a list of sources (default: SOURCES_PATH env var, then sources.json next to this file)
+
+    Returns:
+        Dict[str, Source]: Sources by name, in file order; only the Pydantic AI docs if there is no file
+    """
+    path = path or os.getenv("SOURCES_PATH") or SOURCES_PATH
+    if not os.path.exists(path):
+        return {source.name: source for source in DEFAULT_SOURCES}
+
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    sources = {}
+    for entry in entries:
+        source = Source(**entry)
+        if source.name in sources:
+            raise ValueError(f"Source {source.name!r} is defined twice in {path}")
+        sources[source.name] = source
+    return sources
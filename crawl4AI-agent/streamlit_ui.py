@@ -22,7 +22,9 @@ from pydantic_ai.messages import (
     RetryPromptPart,
     ModelMessagesTypeAdapter
 )
-from pydantic_ai_agent import pydantic_ai_agent, PydanticAIDeps
+from pydantic_ai_agent import pydantic_ai_agent, PydanticAIDeps, context_budget, query_embedding_cache
+from vector_index import LocalVectorIndex
+from sources import DEFAULT_SOURCE
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -34,6 +36,23 @@ supabase: Client = Client(
     os.getenv("SUPABASE_SERVICE_KEY")
 )
 
+# "local" answers retrieval from an in-process copy of the embeddings instead of the database
+retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "supabase")
+
+# The source (from sources.json) the agent answers from
+agent_source = os.getenv("AGENT_SOURCE", DEFAULT_SOURCE)
+
+@st.cache_resource
+def get_vector_index() -> LocalVectorIndex:
+    """Load the local vector index once per server process and sync it with the agent source's rows in Supabase."""
+    index = LocalVectorIndex(
+        os.getenv("VECTOR_INDEX_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_index"),
+        precision=os.getenv("VECTOR_INDEX_PRECISION", "float32"),
+        rerank_factor=int(os.getenv("VECTOR_INDEX_RERANK", "4"))
+    )
+    index.refresh(supabase, source=agent_source)
+    return index
+
 # Configure logfire to suppress warnings (optional)
 logfire.configure(send_to_logfire='never')
 
@@ -73,7 +92,9 @@ async def run_agent_with_streaming(user_input: str):
     # Prepare dependencies
     deps = PydanticAIDeps(
         supabase=supabase,
-        openai_client=openai_client
+        openai_client=openai_client,
+        vector_index=get_vector_index() if retrieval_backend == "local" else None,
+        source=agent_source
     )
 
     # Run the agent in a stream
@@ -103,6 +124,10 @@ async def run_agent_with_streaming(user_input: str):
             ModelResponse(parts=[TextPart(content=partial_text)])
         )
 
+    # Totals since the app started, printed to the terminal running Streamlit
+    print(query_embedding_cache.summary())
+    print(context_budget.summary())
+
 
 async def main():
     st.title("Pydantic AI Expert")
@@ -0,0 +1,346 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import Client
+
+from hybrid_search import BM25Index, reciprocal_rank_fusion
+from quantization import PRECISIONS, approximate_scores, quantize
+from sources import DEFAULT_SOURCE
+
+def contains(document: Any, pattern: Any) -> bool:
+    """Python equivalent of Postgres' jsonb `document @> pattern` containment test."""
+    if isinstance(pattern, dict):
+        return isinstance(document, dict) and all(
+            key in document and contains(document[key], value) for key, value in pattern.items()
+        )
+    if isinstance(pattern, list):
+        return isinstance(document, list) and all(
+            any(contains(item, wanted) for item in document) for wanted in pattern
+        )
+    return document == pattern
+
+def parse_embedding(value: Any) -> List[float]:
+    # PostgREST returns pgvector columns as their text form, "[0.1,0.2,...]"
+    return json.loads(value) if isinstance(value, str) else value
+
+class LocalVectorIndex:
+    """
+    In-process copy of the site_pages embeddings for retrieval without a database round trip.
+
+    Embeddings are kept as one contiguous float32 matrix of unit-length rows in
+    `<path>.npy`, memory-mapped on load, with the other columns in `<path>.json`.
+    A top-k cosine query is a single matrix-vector product. `refresh()` brings
+    the snapshot up to date with Supabase, only downloading rows that are new
+    or were re-crawled since the last refresh. `hybrid_search()` fuses the
+    vector ranking with a BM25 ranking over titles and content, like the
+    match_site_pages_hybrid function does in Postgres.
+
+    With `precision` "float16" or "int8", queries scan a compressed copy of the
+    matrix held in memory (2x or ~4x smaller), and the best `rerank_factor`
+    times as many candidates as requested are re-scored against the
+    memory-mapped float32 rows, so only those rows are read from disk.
+    """
+
+    def __init__(self, path: str, precision: str = "float32", rerank_factor: int = 4):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+        self.path = path
+        self.precision = precision
+        self.rerank_factor = rerank_factor
+        self.rows: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self._filter_masks: Dict[str, np.ndarray] = {}
+        self._lexical: Optional[BM25Index] = None
+        self.load()
+
+    @property
+    def matrix_path(self) -> str:
+        return self.path + ".npy"
+
+    @property
+    def rows_path(self) -> str:
+        return self.path + ".json"
+
+    def _codes_path(self, precision: str) -> str:
+        return f"{self.path}.{precision}.npy"
+
+    def _scales_path(self, precision: str) -> str:
+        return f"{self.path}.{precision}.scales.npy"
+
+    @property
+    def bytes_per_row(self) -> int:
+        """Memory each row's embedding takes in the matrix that queries scan."""
+        scanned = self.matrix if self.codes is None else self.codes
+        if not len(scanned):
+            return 0
+        return scanned.itemsize * scanned.shape[1] + (self.scales.itemsize if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def load(self):
+        """Load the snapshot from disk, if there is one."""
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.rows_path)):
+            return
+        with open(self.rows_path, encoding="utf-8") as f:
+            self.rows = json.load(f)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+        self._filter_masks = {}
+        self._lexical = None
+
+        self.codes = self.scales = None
+        if self.precision != "float32" and len(self.matrix):
+            if not os.path.exists(self._codes_path(self.precision)):
+                self._save_codes(self.matrix)
+            self.codes = np.load(self._codes_path(self.precision))
+            if os.path.exists(self._scales_path(self.precision)):
+                self.scales = np.load(self._scales_path(self.precision))
+
+    def _save_codes(self, matrix: np.ndarray):
+        codes, scales = quantize(matrix, self.precision)
+        np.save(self._codes_path(self.precision) + ".tmp.npy", codes)
+        os.replace(self._codes_path(self.precision) + ".tmp.npy", self._codes_path(self.precision))
+        if scales is not None:
+            np.save(self._scales_path(self.precision) + ".tmp.npy", scales)
+            os.replace(self._scales_path(self.precision) + ".tmp.npy", self._scales_path(self.precision))
+
+    def _save(self, rows: List[Dict[str, Any]], matrix: np.ndarray):
+        # Write to temporary files and swap them in, so a reader never sees half a snapshot
+        np.save(self.matrix_path + ".tmp.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(self.rows_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(self.matrix_path + ".tmp.npy", self.matrix_path)
+        os.replace(self.rows_path + ".tmp", self.rows_path)
+        # Compressed copies of the old matrix are stale now, load() rebuilds the one in use
+        for precision in PRECISIONS:
+            for stale in (self._codes_path(precision), self._scales_path(precision)):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        self.load()
+
+    def replace(self, rows: List[Dict[str, Any]], embeddings: List[List[float]]):
+        """Replace the snapshot with these rows and their embeddings, e.g. to build an index for tests."""
+        if not rows:
+            self._save([], np.zeros((0, 0), dtype=np.float32))
+            return
+        matrix = np.array(embeddings, dtype=np.float32).reshape(len(rows), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._save(rows, matrix / np.where(norms == 0, 1, norms))
+
+    def _mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        key = json.dumps(filter, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (contains(row["metadata"], filter) for row in self.rows), dtype=bool, count=len(self.rows)
+            )
+            self._filter_masks[key] = mask
+        return mask
+
+    def search(
+        self,
+        query_embedding: List[float],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the `match_count` rows most similar to the query, like the match_site_pages RPC.
+
+        Args:
+            query_embedding: The query's embedding vector
+            match_count: How many rows to return
+            filter: Only consider rows whose metadata contains this object
+
+        Returns:
+            List[Dict[str, Any]]: Rows with a `similarity` key, most similar first
+        """
+        top, scores = self._vector_ranking(query_embedding, match_count, self._mask(filter))
+        return [{**self.rows[i], "similarity": float(scores[i])} for i in top]
+
+    def _vector_ranking(
+        self,
+        query_embedding: List[float],
+        count: int,
+        mask: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Row indices of the `count` best matches, best first, and every row's score
+        if not self.rows or count <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = query / norm
+        if self.codes is None:
+            scores = self.matrix @ query
+        else:
+            scores = approximate_scores(self.codes, self.scales, query)
+
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            candidates = int(mask.sum())
+        else:
+            candidates = len(scores)
+        count = min(count, candidates)
+        if count == 0:
+            return np.zeros(0, dtype=np.int64), scores
+
+        if self.codes is not None and self.rerank_factor:
+            # Re-score the best approximate candidates at full precision
+            size = min(count * self.rerank_factor, candidates)
+            shortlist = np.sort(np.argpartition(-scores, size - 1)[:size])  # File order for the memory map
+            scores[shortlist] = np.asarray(self.matrix[shortlist]) @ query
+            top = shortlist[np.argsort(-scores[shortlist])[:count]]
+            return top, scores
+
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top])], scores
+
+    @property
+    def lexical(self) -> BM25Index:
+        """BM25 index over each row's title and content, built on first use."""
+        if self._lexical is None:
+            self._lexical = BM25Index([f"{row['title']}\n{row['content']}" for row in self.rows])
+        return self._lexical
+
+    def lexical_search(
+        self,
+        query_text: str,
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the `match_count` best rows by BM25 score over title and content."""
+        if not self.rows:
+            return []
+        return [
+            {**self.rows[i], "score": score}
+            for i, score in self.lexical.search(query_text, match_count, self._mask(filter))
+        ]
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: List[float],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        candidate_count: int = 20,
+        rrf_k: int = 60
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the `match_count` best rows by reciprocal rank fusion of vector and BM25 rankings.
+
+        Args:
+            query_text: The query, for the BM25 ranking
+            query_embedding: The query's embedding vector, for the vector ranking
+            match_count: How many rows to return
+            filter: Only consider rows whose metadata contains this object
+            candidate_count: How many rows each ranking contributes to the fusion
+            rrf_k: Reciprocal rank fusion constant; higher values flatten the rank weights
+
+        Returns:
+            List[Dict[str, Any]]: Rows with `similarity` (cosine) and `score` (fused) keys, best first
+        """
+        mask = self._mask(filter)
+        vector_top, similarities = self._vector_ranking(query_embedding, candidate_count, mask)
+        lexical_top = [i for i, _ in self.lexical.search(query_text, candidate_count, mask)] if self.rows else []
+        fused = reciprocal_rank_fusion([vector_top.tolist(), lexical_top], k=rrf_k)[:match_count]
+
+        return [
+            {**self.rows[i], "similarity": float(similarities[i]) if len(similarities) else None, "score": score}
+            for i, score in fused
+        ]
+
+    def refresh(
+        self,
+        supabase: Client,
+        table: str = "site_pages",
+        page_size: int = 1000,
+        source: Optional[str] = None
+    ) -> Tuple[int, int]:
+        """
+        Sync the snapshot with the database, or with one source's rows of it.
+
+        Rows are matched on id and their metadata.crawled_at, which the crawler
+        updates whenever it rewrites a chunk, so only new and re-crawled rows are
+        downloaded with their embeddings.
+
+        Returns:
+            Tuple[int, int]: Number of rows downloaded and number of rows dropped
+        """
+        # List every embedded row's id and crawl time, a page at a time
+        remote: Dict[int, Optional[str]] = {}
+        start = 0
+        while True:
+            query = supabase.from_(table) \
+                .select("id, crawled_at:metadata->>crawled_at") \
+                .not_.is_("embedding", "null")
+            if source:
+                query = query.eq("metadata->>source", source)
+            result = query \
+                .order("id") \
+                .range(start, start + page_size - 1) \
+                .execute()
+            for row in result.data:
+                remote[row["id"]] = row["crawled_at"]
+            if len(result.data) < page_size:
+                break
+            start += page_size
+
+        # Keep local rows that are unchanged, download everything else
+        kept = [
+            i for i, row in enumerate(self.rows)
+            if row["id"] in remote and remote[row["id"]] == row["metadata"].get("crawled_at")
+        ]
+        kept_ids = {self.rows[i]["id"] for i in kept}
+        missing = [row_id for row_id in remote if row_id not in kept_ids]
+
+        fetched: List[Dict[str, Any]] = []
+        for i in range(0, len(missing), 200):
+            result = supabase.from_(table) \
+                .select("id, url, chunk_number, title, summary, content, metadata, embedding") \
+                .in_("id", missing[i:i + 200]) \
+                .execute()
+            fetched.extend(result.data)
+
+        dropped = len(self.rows) - len(kept)
+        if not fetched and not dropped:
+            return 0, 0
+
+        new_vectors = np.array([parse_embedding(row.pop("embedding")) for row in fetched], dtype=np.float32)
+        if len(fetched):
+            norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+            new_vectors /= np.where(norms == 0, 1, norms)
+
+        parts = []
+        if kept:
+            parts.append(np.asarray(self.matrix[kept]))
+        if len(fetched):
+            parts.append(new_vectors)
+        matrix = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        self._save([self.rows[i] for i in kept] + fetched, matrix)
+        return len(fetched), dropped
+
+def main():
+    load_dotenv()
+    supabase = Client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    index = LocalVectorIndex(
+        os.getenv("VECTOR_INDEX_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_index"),
+        precision=os.getenv("VECTOR_INDEX_PRECISION", "float32"),
+        rerank_factor=int(os.getenv("VECTOR_INDEX_RERANK", "4"))
+    )
+    downloaded, dropped = index.refresh(supabase, source=os.getenv("AGENT_SOURCE", DEFAULT_SOURCE))
+    print(
+        f"Vector index: {len(index)} rows ({downloaded} downloaded, {dropped} dropped), "
+        f"{index.precision} at {index.bytes_per_row} bytes per row"
+    )
+
+if __name__ == "__main__":
+    main()
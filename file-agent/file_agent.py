@@ -1,23 +1,37 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from fastapi import FastAPI, HTTPException, Security, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
 from supabase import create_client, Client
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
 import sys
 import os
+import json
+import time
 import base64
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from history_cache import HistoryEntry, count_tokens, truncate_text, history_cache_from_env
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await history_cache.close()
+
 # Initialize FastAPI app and OpenAI client
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# The streaming endpoint reads the completion as it arrives without blocking the event loop
+async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # Supabase setup
 supabase: Client = create_client(
@@ -62,12 +76,13 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
 async def fetch_conversation_history(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Fetch the most recent conversation history for a session."""
     try:
-        response = supabase.table("messages") \
+        query = supabase.table("messages") \
             .select("*") \
             .eq("session_id", session_id) \
             .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
+            .limit(limit)
+        # The Supabase client is synchronous, keep its requests off the event loop
+        response = await asyncio.to_thread(query.execute)
         
         # Convert to list and reverse to get chronological order
         messages = response.data[::-1]
@@ -85,13 +100,18 @@ async def store_message(session_id: str, message_type: str, content: str, data:
         message_obj["data"] = data
 
     try:
-        supabase.table("messages").insert({
-            "session_id": session_id,
-            "message": message_obj
-        }).execute()
+        await asyncio.to_thread(
+            supabase.table("messages").insert({
+                "session_id": session_id,
+                "message": message_obj
+            }).execute
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store message: {str(e)}")
 
+    # Write-through, so the session's next turn doesn't read it back
+    await history_cache.append(session_id, message_obj)
+
 def process_files_to_string(files: Optional[List[Dict[str, Any]]]) -> str:
     """Convert a list of files with base64 content into a formatted string."""
     if not files:
@@ -103,52 +123,102 @@ def process_files_to_string(files: Optional[List[Dict[str, Any]]]) -> str:
         file_content += f"{i}. {file['name']}:\n\n{decoded_content}\n\n"
     return file_content        
 
+async def build_openai_messages(request: AgentRequest) -> List[Dict[str, str]]:
+    """Build the OpenAI messages from the session's history and the request's files, then store the user's query."""
+    # Conversation history in the OpenAI format, from the DB only if not cached
+    messages = await history_cache.get(
+        request.session_id,
+        lambda: fetch_conversation_history(request.session_id, history_cache.limit)
+    )
+
+    # Store user's query with files if present
+    message_data = {"request_id": request.request_id}
+    if request.files:
+        message_data["files"] = request.files
+
+    await store_message(
+        session_id=request.session_id,
+        message_type="human",
+        content=request.query,
+        data=message_data
+    )
+
+    # Prepare current message with files for OpenAI
+    current_message = request.query
+    if request.files:
+        files_content = process_files_to_string(request.files)
+        current_message = f"{files_content}\n\n{current_message}"
+
+    # Prepare messages for OpenAI
+    openai_messages = []
+    openai_messages.extend(messages)  # Add conversation history
+    openai_messages.append({"role": "user", "content": current_message})
+    return openai_messages
+
+def file_references(files: List[Dict[str, Any]]) -> str:
+    """Short stand-in for files attached to an earlier message, used once their content no longer fits the history."""
+    references = "Files shared earlier in the conversation (content no longer included):\n"
+    for i, file in enumerate(files, 1):
+        # Size of the decoded file, from the length of its base64 encoding
+        size = len(file['base64']) * 3 // 4
+        references += f"{i}. {file['name']} ({size / 1024:.1f} KB)\n"
+    return references
+
+def to_openai_message(msg_data: Dict[str, Any]) -> HistoryEntry:
+    """
+    Convert a stored message to the format expected by the OpenAI API.
+
+    A user message with files gets two forms: with the files' content inlined,
+    and a compact one that only names them, used once the message is older
+    than the newest one with files. When the newest files don't fit the
+    history, their content is cut rather than replaced by the names.
+    """
+    msg_type = "user" if msg_data["type"] == "human" else "assistant" # Type conversion for OpenAI API
+    msg_content = msg_data["content"]
+
+    # Process files if they exist in the message data
+    files = (msg_data.get("data") or {}).get("files") if msg_type == "user" else None
+    files_content = process_files_to_string(files)
+    if not files_content:
+        return HistoryEntry(
+            {"role": msg_type, "content": msg_content},
+            count_tokens(msg_content),
+            truncate=lambda max_tokens: {"role": msg_type, "content": truncate_text(msg_content, max_tokens)}
+        )
+
+    full_content = f"{files_content}\n\n{msg_content}"
+    compact_content = f"{file_references(files)}\n{msg_content}"
+
+    def truncate(max_tokens: int) -> Dict[str, str]:
+        # Cut the files' content, not the question that follows it
+        files_budget = max_tokens - count_tokens(msg_content) - 2
+        if files_budget <= 0:
+            return {"role": msg_type, "content": truncate_text(full_content, max_tokens)}
+        return {"role": msg_type, "content": f"{truncate_text(files_content, files_budget)}\n\n{msg_content}"}
+
+    return HistoryEntry(
+        {"role": msg_type, "content": full_content},
+        count_tokens(full_content),
+        compact={"role": msg_type, "content": compact_content},
+        compact_tokens=count_tokens(compact_content),
+        truncate=truncate
+    )
+
+# Recent messages of each session, see history_cache.py
+history_cache = history_cache_from_env(to_openai_message)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/api/file-agent", response_model=AgentResponse)
 async def file_agent(
     request: AgentRequest,
     authenticated: bool = Depends(verify_token)
 ):
     try:
-        # Fetch conversation history from the DB
-        conversation_history = await fetch_conversation_history(request.session_id)
-        
-        # Convert conversation history to format expected by agent
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = "user" if msg_data["type"] == "human" else "assistant" # Type conversion for OpenAI API
-            msg_content = msg_data["content"]
-            
-            # Process files if they exist in the message data
-            if msg_type == "user" and "data" in msg_data and "files" in msg_data["data"]:
-                files_content = process_files_to_string(msg_data["data"]["files"])
-                if files_content:
-                    msg_content = f"{files_content}\n\n{msg_content}"
-            
-            messages.append({"role": msg_type, "content": msg_content})
-
-        # Store user's query with files if present
-        message_data = {"request_id": request.request_id}
-        if request.files:
-            message_data["files"] = request.files
-
-        await store_message(
-            session_id=request.session_id,
-            message_type="human",
-            content=request.query,
-            data=message_data
-        )
-
-        # Prepare current message with files for OpenAI
-        current_message = request.query
-        if request.files:
-            files_content = process_files_to_string(request.files)
-            current_message = f"{files_content}\n\n{current_message}"
-
-        # Prepare messages for OpenAI
-        openai_messages = []
-        openai_messages.extend(messages)  # Add conversation history
-        openai_messages.append({"role": "user", "content": current_message})
+        # Conversation history, files and the query, in OpenAI's message format
+        openai_messages = await build_openai_messages(request)
 
         # Get response from OpenAI
         completion = openai_client.chat.completions.create(
@@ -178,6 +248,73 @@ async def file_agent(
         )
         return AgentResponse(success=False)
 
+@app.post("/api/file-agent/stream")
+async def file_agent_stream(
+    request: AgentRequest,
+    authenticated: bool = Depends(verify_token)
+):
+    """
+    Streaming variant of /api/file-agent.
+
+    Sends a `delta` Server-Sent Event for each piece of the response as
+    OpenAI generates it, then `done` with timing metrics (or `error`). The
+    complete response is stored in the messages table once, at the end.
+    """
+    async def events() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        time_to_first_token = None
+        agent_response = ""
+        try:
+            openai_messages = await build_openai_messages(request)
+
+            # Stream the response from OpenAI
+            stream = await async_openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=openai_messages,
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                agent_response += delta
+                yield sse_event("delta", {"text": delta})
+
+            metrics = {
+                "time_to_first_token": time_to_first_token,
+                "total_time": time.perf_counter() - start
+            }
+
+            # Store agent's response
+            await store_message(
+                session_id=request.session_id,
+                message_type="ai",
+                content=agent_response,
+                data={"request_id": request.request_id, "metrics": metrics}
+            )
+            print(f"Streamed response for {request.request_id}: first token after {time_to_first_token or 0:.2f}s, total {metrics['total_time']:.2f}s")
+            yield sse_event("done", {"success": True, **metrics})
+
+        except Exception as e:
+            print(f"Error streaming request: {str(e)}")
+            # Store error message in conversation
+            await store_message(
+                session_id=request.session_id,
+                message_type="ai",
+                content="I apologize, but I encountered an error processing your request.",
+                data={"error": str(e), "request_id": request.request_id}
+            )
+            yield sse_event("error", {"success": False, "error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     # Feel free to change the port here if you need
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Approximate characters per token when tiktoken isn't available
+CHARS_PER_TOKEN = 4
+# Approximate tokens the chat format adds around each message
+MESSAGE_OVERHEAD = 4
+# Appended where a message was cut to fit the history
+TRUNCATION_MARKER = "\n[... truncated to fit the conversation history]"
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text, with the cl100k_base encoding if tiktoken is installed."""
+    if tiktoken is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(_get_encoding().encode(text, disallowed_special=()))
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Keep the start of text up to about `max_tokens` tokens, marking the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)
+    if tiktoken is None:
+        return text[:keep * CHARS_PER_TOKEN] + TRUNCATION_MARKER
+    encoding = _get_encoding()
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]) + TRUNCATION_MARKER
+
+@dataclass
+class HistoryEntry:
+    """A converted message and its size in tokens, counted once when it is cached."""
+    message: Any
+    tokens: int
+    # Smaller form of the message, e.g. with attached files replaced by references
+    compact: Any = None
+    compact_tokens: int = 0
+    # Returns the full message cut to about the given number of tokens
+    truncate: Optional[Callable[[int], Any]] = None
+
+def fit_history(entries: List[HistoryEntry], max_tokens: int) -> List[Any]:
+    """
+    Select the newest messages that fit a token budget.
+
+    The newest message is always kept, cut to the budget if it is too long.
+    Only the newest entry with a compact form (e.g. the latest files) is given
+    in full, cut to the tokens left if needed; older ones are given in compact
+    form. The window ends at the first message that doesn't fit, so older
+    turns are dropped first and a turn is never skipped.
+
+    Args:
+        entries: The session's messages, oldest first
+        max_tokens: Token budget for the history (0 for no budget)
+
+    Returns:
+        List[Any]: The messages to send, oldest first
+    """
+    window = []
+    used = 0
+    newest_with_compact = True
+    for entry in reversed(entries):
+        available = max_tokens - used - MESSAGE_OVERHEAD
+        full = entry.compact is None or newest_with_compact
+        if entry.compact is not None:
+            newest_with_compact = False
+
+        if full and (not max_tokens or entry.tokens <= available):
+            message, tokens = entry.message, entry.tokens
+        elif (
+            full and entry.truncate is not None and available > 0
+            # The newest message, or the latest files if more of them fit than their compact form
+            and (not window or (entry.compact is not None and available > entry.compact_tokens))
+        ):
+            message, tokens = entry.truncate(available), available
+        elif entry.compact is not None and (not max_tokens or entry.compact_tokens <= available):
+            message, tokens = entry.compact, entry.compact_tokens
+        else:
+            break
+        window.append(message)
+        used += tokens + MESSAGE_OVERHEAD
+    window.reverse()
+    return window
+
+class HistoryCache:
+    """
+    The last `limit` messages of each session, already converted for the agent
+    and counted in tokens; get() returns the newest of them that fit `max_tokens`.
+
+    Writes go to the messages table first and are then appended here
+    (write-through), so a hot session's history is never read back from the
+    database. This holds as long as a session's messages are only written by
+    this process, or by processes sharing the same Redis.
+
+    By default sessions are kept in this process: the least recently used one
+    is dropped past `max_sessions`, and any session idle for `idle_seconds`.
+    With a `redis_url` (a local Redis, or a server speaking its protocol such as
+    Valkey) the raw messages are kept there instead, with the idle time as TTL,
+    so several workers can share them; they are converted on every read.
+    """
+
+    def __init__(
+        self,
+        convert: Callable[[Dict[str, Any]], HistoryEntry],
+        limit: int = 10,
+        max_tokens: int = 0,
+        max_sessions: int = 1000,
+        idle_seconds: float = 1800,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "history:"
+    ):
+        self.convert = convert
+        self.limit = limit
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.key_prefix = key_prefix
+        # session_id -> (last access, converted messages), least recently used first
+        self.sessions: OrderedDict[str, Tuple[float, List[HistoryEntry]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.redis = None
+        if redis_url:
+            if redis is None:
+                raise ImportError("HISTORY_CACHE_REDIS_URL is set but the redis package is not installed (pip install redis)")
+            self.redis = redis.from_url(redis_url)
+
+    async def get(self, session_id: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Any]:
+        """
+        Get a session's recent messages that fit the token budget, oldest first.
+
+        Args:
+            session_id: The conversation's session ID
+            load: Fetches the session's last `limit` rows from the messages table, called on a miss
+
+        Returns:
+            List[Any]: A new list of converted messages, which the caller may modify
+        """
+        if self.redis is not None:
+            return await self._get_shared(session_id, load)
+
+        self._evict_idle()
+        entry = self.sessions.get(session_id)
+        if entry is not None:
+            self.hits += 1
+            self._put(session_id, entry[1])
+            return fit_history(entry[1], self.max_tokens)
+
+        self.misses += 1
+        entries = [self.convert(row["message"]) for row in await load()]
+        self._put(session_id, entries)
+        return fit_history(entries, self.max_tokens)
+
+    async def append(self, session_id: str, message: Dict[str, Any]):
+        """
+        Add a message that was just stored in the messages table.
+
+        Sessions that are not cached are left alone; their next get() loads them.
+
+        Args:
+            session_id: The conversation's session ID
+            message: The stored message object (type, content and optional data)
+        """
+        if self.redis is not None:
+            key = self.key_prefix + session_id
+            async with self.redis.pipeline(transaction=True) as pipe:
+                # RPUSHX only appends to a list that already exists
+                pipe.rpushx(key, json.dumps(message, default=str))
+                pipe.ltrim(key, -self.limit, -1)
+                pipe.expire(key, int(self.idle_seconds))
+                await pipe.execute()
+            return
+
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            return
+        entries = entry[1]
+        entries.append(self.convert(message))
+        del entries[:-self.limit]
+        self._put(session_id, entries)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def _put(self, session_id: str, entries: List[HistoryEntry]):
+        self.sessions[session_id] = (time.monotonic(), entries)
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def _evict_idle(self):
+        # Sessions are ordered by last access, so the idle ones are at the front
+        cutoff = time.monotonic() - self.idle_seconds
+        while self.sessions:
+            session_id, (last_access, _) = next(iter(self.sessions.items()))
+            if last_access > cutoff:
+                break
+            del self.sessions[session_id]
+
+    async def _get_shared(self, session_id: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Any]:
+        key = self.key_prefix + session_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, -self.limit, -1)
+            # Refreshes the TTL, and tells whether the key exists
+            pipe.expire(key, int(self.idle_seconds))
+            raw, exists = await pipe.execute()
+        if exists:
+            self.hits += 1
+            return fit_history([self.convert(json.loads(item)) for item in raw], self.max_tokens)
+
+        self.misses += 1
+        stored = [row["message"] for row in await load()]
+        if stored:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *(json.dumps(message, default=str) for message in stored))
+                pipe.expire(key, int(self.idle_seconds))
+                await pipe.execute()
+        return fit_history([self.convert(message) for message in stored], self.max_tokens)
+
+def history_cache_from_env(convert: Callable[[Dict[str, Any]], HistoryEntry]) -> HistoryCache:
+    """
+    Create the endpoint's history cache from the HISTORY_* environment variables.
+
+    Args:
+        convert: Turns a stored message object into the agent's message format
+
+    Returns:
+        HistoryCache: In-process, or backed by HISTORY_CACHE_REDIS_URL if set
+    """
+    return HistoryCache(
+        convert,
+        limit=int(os.getenv("HISTORY_MAX_MESSAGES", "50")),
+        max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "4000")),
+        max_sessions=int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "1000")),
+        idle_seconds=float(os.getenv("HISTORY_CACHE_IDLE_SECONDS", "1800")),
+        redis_url=os.getenv("HISTORY_CACHE_REDIS_URL") or None
+    )
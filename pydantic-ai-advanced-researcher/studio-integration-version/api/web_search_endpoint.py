@@ -1,11 +1,16 @@
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Security, Depends
+from typing import List, Optional, Dict, Any, AsyncIterator
+from fastapi import FastAPI, HTTPException, Security, Depends, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from supabase import create_client, Client
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
 import httpx
+import json
+import time
 import sys
 import os
 
@@ -14,13 +19,22 @@ from pydantic_ai.messages import ModelTextResponse, UserPrompt
 # Add parent directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from pydantic_ai_web_researcher.web_search_agent import web_search_agent, Deps
+from pydantic_ai_web_researcher.web_search_agent import web_search_agent, Deps, create_http_client
+from history_cache import HistoryEntry, count_tokens, truncate_text, history_cache_from_env
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every request, so connections and TLS sessions are reused
+    app.state.http_client = create_http_client()
+    yield
+    await app.state.http_client.aclose()
+    await history_cache.close()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
 
 # Supabase setup
@@ -39,6 +53,10 @@ class AgentRequest(BaseModel):
 class AgentResponse(BaseModel):
     success: bool
 
+def get_http_client(http_request: Request) -> httpx.AsyncClient:
+    """The app's shared HTTP client, for the agent's dependencies."""
+    return http_request.app.state.http_client
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> bool:
     """Verify the bearer token against environment variable."""
     expected_token = os.getenv("API_BEARER_TOKEN")
@@ -54,15 +72,33 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
         )
     return True    
 
+def to_agent_message(msg_data: Dict[str, Any]) -> HistoryEntry:
+    """Convert a stored message to the format expected by the agent, with its size in tokens."""
+    msg_type = msg_data["type"]
+    msg_content = msg_data["content"]
+
+    def build(content: str):
+        return UserPrompt(content=content) if msg_type == "human" else ModelTextResponse(content=content)
+
+    return HistoryEntry(
+        build(msg_content),
+        count_tokens(msg_content),
+        truncate=lambda max_tokens: build(truncate_text(msg_content, max_tokens))
+    )
+
+# Recent messages of each session, see history_cache.py
+history_cache = history_cache_from_env(to_agent_message)
+
 async def fetch_conversation_history(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Fetch the most recent conversation history for a session."""
     try:
-        response = supabase.table("messages") \
+        query = supabase.table("messages") \
             .select("*") \
             .eq("session_id", session_id) \
             .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
+            .limit(limit)
+        # The Supabase client is synchronous, keep its requests off the event loop
+        response = await asyncio.to_thread(query.execute)
         
         # Convert to list and reverse to get chronological order
         messages = response.data[::-1]
@@ -80,53 +116,75 @@ async def store_message(session_id: str, message_type: str, content: str, data:
         message_obj["data"] = data
 
     try:
-        supabase.table("messages").insert({
-            "session_id": session_id,
-            "message": message_obj
-        }).execute()
+        await asyncio.to_thread(
+            supabase.table("messages").insert({
+                "session_id": session_id,
+                "message": message_obj
+            }).execute
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store message: {str(e)}")
 
+    # Write-through, so the session's next turn doesn't read it back
+    await history_cache.append(session_id, message_obj)
+
+async def load_history_and_store_query(request: AgentRequest) -> List[Any]:
+    """Get the session's history in the format expected by the agent, then store the user's query."""
+    # Conversation history in the format expected by agent, from the database only if not cached
+    messages = await history_cache.get(
+        request.session_id,
+        lambda: fetch_conversation_history(request.session_id, history_cache.limit)
+    )
+
+    # Store user's query
+    await store_message(
+        session_id=request.session_id,
+        message_type="human",
+        content=request.query
+    )
+    return messages
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def tool_events(messages: List[Any]) -> List[str]:
+    """SSE events for the tool calls and tool results among the agent's new messages."""
+    events = []
+    for message in messages:
+        if message.role == "model-structured-response":
+            for call in message.calls:
+                args = getattr(call.args, "args_object", None) or getattr(call.args, "args_json", None)
+                events.append(sse_event("tool_call", {"tool_name": call.tool_name, "args": args}))
+        elif message.role == "tool-return":
+            # Search results can be long, the client only gets a preview
+            events.append(sse_event("tool_result", {"tool_name": message.tool_name, "content": str(message.content)[:500]}))
+    return events
+
 @app.post("/api/pydantic-search-agent", response_model=AgentResponse)
 async def web_search(
     request: AgentRequest,
-    authenticated: bool = Depends(verify_token)
+    authenticated: bool = Depends(verify_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     try:
-        # Fetch conversation history
-        conversation_history = await fetch_conversation_history(request.session_id)
-        
-        # Convert conversation history to format expected by agent
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = msg_data["type"]
-            msg_content = msg_data["content"]
-            msg = UserPrompt(content=msg_content) if msg_type == "human" else ModelTextResponse(content=msg_content)
-            messages.append(msg)
-
-        # Store user's query
-        await store_message(
-            session_id=request.session_id,
-            message_type="human",
-            content=request.query
-        )            
+        # Fetch conversation history and store the user's query
+        messages = await load_history_and_store_query(request)
 
         # Initialize agent dependencies
-        async with httpx.AsyncClient() as client:
-            deps = Deps(
-                client=client,
-                supabase=supabase,
-                session_id=request.session_id,
-                brave_api_key=os.getenv("BRAVE_API_KEY")
-            )
+        deps = Deps(
+            client=http_client,
+            supabase=supabase,
+            session_id=request.session_id,
+            brave_api_key=os.getenv("BRAVE_API_KEY")
+        )
 
-            # Run the agent with conversation history
-            result = await web_search_agent.run(
-                request.query,
-                message_history=messages,
-                deps=deps
-            )
+        # Run the agent with conversation history
+        result = await web_search_agent.run(
+            request.query,
+            message_history=messages,
+            deps=deps
+        )
 
         # Store agent's response
         await store_message(
@@ -149,6 +207,82 @@ async def web_search(
         )
         return AgentResponse(success=False)
 
+@app.post("/api/pydantic-search-agent/stream")
+async def web_search_stream(
+    request: AgentRequest,
+    authenticated: bool = Depends(verify_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """
+    Streaming variant of /api/pydantic-search-agent.
+
+    Sends Server-Sent Events as the agent runs: `tool_call` and `tool_result`
+    for the searches it made, `delta` for each piece of the answer's text, then
+    `done` with timing metrics (or `error`). The complete answer is stored in
+    the messages table once, at the end.
+    """
+    async def events() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        time_to_first_token = None
+        response_text = ""
+        try:
+            messages = await load_history_and_store_query(request)
+
+            deps = Deps(
+                client=http_client,
+                supabase=supabase,
+                session_id=request.session_id,
+                brave_api_key=os.getenv("BRAVE_API_KEY")
+            )
+
+            async with web_search_agent.run_stream(
+                request.query,
+                message_history=messages,
+                deps=deps
+            ) as result:
+                # Searches were made before the model started its answer
+                for event in tool_events(result.new_messages()):
+                    yield event
+
+                async for delta in result.stream_text(delta=True):
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - start
+                    response_text += delta
+                    yield sse_event("delta", {"text": delta})
+
+            metrics = {
+                "time_to_first_token": time_to_first_token,
+                "total_time": time.perf_counter() - start
+            }
+
+            # Store agent's response
+            await store_message(
+                session_id=request.session_id,
+                message_type="ai",
+                content=response_text,
+                data={"request_id": request.request_id, "metrics": metrics}
+            )
+            print(f"Streamed response for {request.request_id}: first token after {time_to_first_token or 0:.2f}s, total {metrics['total_time']:.2f}s")
+            yield sse_event("done", {"success": True, **metrics})
+
+        except Exception as e:
+            print(f"Error streaming agent response: {str(e)}")
+            # Store error message in conversation
+            await store_message(
+                session_id=request.session_id,
+                message_type="ai",
+                content="I apologize, but I encountered an error processing your request.",
+                data={"error": str(e), "request_id": request.request_id}
+            )
+            yield sse_event("error", {"success": False, "error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
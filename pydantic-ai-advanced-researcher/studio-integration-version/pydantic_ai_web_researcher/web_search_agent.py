@@ -8,6 +8,7 @@ from typing import Any
 
 import logfire
 from devtools import debug
+import httpx
 from httpx import AsyncClient
 from dotenv import load_dotenv
 
@@ -37,6 +38,32 @@ class Deps:
     session_id: str
     brave_api_key: str | None
 
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the pooled HTTP client Deps expects.
+
+    Connections are kept alive (over HTTP/2 when the h2 package is installed)
+    and capped, and requests time out. Create one per process and share it:
+    a client per request pays for a new TCP and TLS handshake every time.
+    """
+    try:
+        import h2  # noqa: F401 - httpx needs it for HTTP/2
+        http2 = os.getenv("HTTP2", "true").lower() == "true"
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("HTTP_TIMEOUT", "10")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        )
+    )
+
 
 web_search_agent = Agent(
     model,
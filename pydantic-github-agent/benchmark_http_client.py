@@ -0,0 +1,126 @@
+import os
+import ssl
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Awaitable, Callable, List
+
+import httpx
+import numpy as np
+
+from github_agent import create_http_client
+
+class MockAPI:
+    """
+    Local HTTPS server standing in for api.github.com, so the load test never leaves the machine.
+
+    It speaks HTTP/1.1 with keep-alive, answers every request with a small JSON
+    body after `delay` seconds and counts the connections (TLS handshakes) it accepts.
+    """
+
+    def __init__(self, certfile: str, keyfile: str, delay: float):
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.context.set_alpn_protocols(["http/1.1"])
+        self.delay = delay
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0, ssl=self.context)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        body = b'{"full_name": "octocat/hello-world", "stargazers_count": 42}'
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(self.delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+                if b"connection: close" in head.lower():
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+def self_signed_certificate(directory: str) -> tuple[str, str]:
+    """Create a certificate for 127.0.0.1 with the openssl CLI."""
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1",
+            "-addext", "subjectAltName=IP:127.0.0.1"
+        ],
+        check=True, capture_output=True
+    )
+    return certfile, keyfile
+
+async def load(request: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> tuple[List[float], float]:
+    """Send `requests` requests, at most `concurrency` at a time; returns each request's latency and the total time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    return latencies, time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Compare a new HTTP client per request with the shared pooled client against a local mock API."
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=20, help="Time the mock API takes to answer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = self_signed_certificate(directory)
+        # Both clients trust the mock API's certificate through SSL_CERT_FILE
+        os.environ["SSL_CERT_FILE"] = certfile
+        api = MockAPI(certfile, keyfile, args.delay_ms / 1000)
+        url = f"https://127.0.0.1:{await api.start()}/repos/octocat/hello-world"
+
+        async def per_request():
+            async with httpx.AsyncClient() as client:
+                (await client.get(url)).raise_for_status()
+
+        shared = create_http_client()
+
+        async def pooled():
+            (await shared.get(url)).raise_for_status()
+
+        print(f"{args.requests} requests, {args.concurrency} concurrent, {args.delay_ms:g} ms server time")
+        print(f"{'client':<14}{'p50 ms':>9}{'p95 ms':>9}{'total s':>9}{'req/s':>9}{'connections':>13}")
+        try:
+            for name, request in (("per request", per_request), ("shared pool", pooled)):
+                api.connections = 0
+                latencies, total = await load(request, args.requests, args.concurrency)
+                print(
+                    f"{name:<14}{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}"
+                    f"{total:>9.2f}{args.requests / total:>9.0f}{api.connections:>13}"
+                )
+        finally:
+            await shared.aclose()
+            await api.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
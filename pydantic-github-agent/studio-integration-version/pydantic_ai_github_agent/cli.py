@@ -3,11 +3,10 @@ from dotenv import load_dotenv
 from typing import List
 import asyncio
 import logfire
-import httpx
 import os
 
 from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, UserPromptPart
-from github_agent_ai import github_agent, Deps
+from github_agent_ai import github_agent, Deps, create_http_client
 
 # Load environment variables
 load_dotenv()
@@ -19,7 +18,7 @@ class CLI:
     def __init__(self):
         self.messages: List[ModelMessage] = []
         self.deps = Deps(
-            client=httpx.AsyncClient(),
+            client=create_http_client(),
             github_token=os.getenv('GITHUB_TOKEN'),
         )
 
@@ -1,11 +1,12 @@
 from typing import List, Optional, Dict, Any, Union
-from fastapi import FastAPI, HTTPException, Security, Depends
+from fastapi import FastAPI, HTTPException, Security, Depends, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from supabase import create_client, Client
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pathlib import Path
-import requests
+from contextlib import asynccontextmanager
+import httpx
 import sys
 import os
 import json
@@ -13,8 +14,41 @@ import json
 # Load environment variables
 load_dotenv()
 
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the pooled HTTP client for the Voiceflow Dialog API.
+
+    Connections are kept alive (over HTTP/2 when the h2 package is installed)
+    and capped. The read timeout is long by default because a Voiceflow turn
+    can run LLM and API steps before it answers.
+    """
+    try:
+        import h2  # noqa: F401 - httpx needs it for HTTP/2
+        http2 = os.getenv("HTTP2", "true").lower() == "true"
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("HTTP_TIMEOUT", "120")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        )
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every request, so connections to Voiceflow are reused
+    app.state.http_client = create_http_client()
+    yield
+    await app.state.http_client.aclose()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
 
 # Supabase setup
@@ -33,6 +67,10 @@ class AgentRequest(BaseModel):
 class AgentResponse(BaseModel):
     success: bool
 
+def get_http_client(http_request: Request) -> httpx.AsyncClient:
+    """The app's shared HTTP client for calls to the Voiceflow Dialog API."""
+    return http_request.app.state.http_client
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> bool:
     """Verify the bearer token against environment variable."""
     expected_token = os.getenv("API_BEARER_TOKEN")
@@ -65,7 +103,7 @@ async def store_message(session_id: str, message_type: str, content: str, data:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store message: {str(e)}")
 
-def interact_with_voiceflow(action: dict, session_id: str) -> dict:
+async def interact_with_voiceflow(client: httpx.AsyncClient, action: dict, session_id: str) -> dict:
     """
     Send an interaction request to Voiceflow Dialog API.
     NOTE: Right now this only supports text responses, but in
@@ -73,6 +111,7 @@ def interact_with_voiceflow(action: dict, session_id: str) -> dict:
     That is why the payload can also be a dict and the action_type is dynamic.
     
     Args:
+        client (httpx.AsyncClient): Shared HTTP client the request is sent with
         action (dict): Type of action and payload to send to the Voiceflow Dialog API
         session_id (str): Session ID for the user
         
@@ -80,7 +119,7 @@ def interact_with_voiceflow(action: dict, session_id: str) -> dict:
         dict: JSON response from the API
         
     Raises:
-        requests.exceptions.RequestException: If the request fails
+        httpx.HTTPError: If the request fails
         KeyError: If the API key environment variable is not set
     """
     
@@ -116,7 +155,7 @@ def interact_with_voiceflow(action: dict, session_id: str) -> dict:
     }
     
     # Make the POST request
-    response = requests.post(
+    response = await client.post(
         url=f"{url}?logs=off",
         headers=headers,
         json=body
@@ -131,7 +170,8 @@ def interact_with_voiceflow(action: dict, session_id: str) -> dict:
 @app.post("/api/sample-voiceflow-agent", response_model=AgentResponse)
 async def sample_voiceflow_agent(
     request: AgentRequest,
-    authenticated: bool = Depends(verify_token)
+    authenticated: bool = Depends(verify_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     try:
         # Process the query - it could be either plain text or JSON
@@ -161,7 +201,8 @@ async def sample_voiceflow_agent(
         )
 
         # Call the Voicflow Dialog API with the appropriate action
-        agent_response = interact_with_voiceflow(
+        agent_response = await interact_with_voiceflow(
+            client=http_client,
             action=action,
             session_id=request.session_id
         )